@@ -0,0 +1,73 @@
+import argparse
+import sys
+from datetime import date
+
+import numpy as np
+
+from utils.dca import DAILY, MONTHLY, YEARLY, purchase_schedule, rolling_dca, simulate_dca
+from utils.trading_calendar import get_sessions
+
+DEFAULT_TOLERANCE = 1e-9
+NUM_OF_DAYS_IN_A_YEAR = 365.25
+# (frequency, window length in years, buys every window must hold, or None when it depends on the calendar)
+WINDOW_CASES = [(MONTHLY, 1, 12), (MONTHLY, 5, 60), (MONTHLY, 10, 120),
+                (YEARLY, 1, 1), (YEARLY, 5, 5), (YEARLY, 10, 10),
+                (DAILY, 1, None), (DAILY, 5, None)]
+# Windows compared with a plain simulate_dca over their own sessions, one in every REFERENCE_STRIDE
+REFERENCE_STRIDE = 97
+
+
+def history():
+    # Every NYSE session up to today, with a deterministic random walk as the closes
+    days = get_sessions()
+    days = days[days <= np.datetime64(date.today(), "D")]
+    returns = np.random.default_rng(0).normal(0.0003, 0.01, len(days))
+    return days, 100 * np.exp(np.cumsum(returns))
+
+
+def window_failures(days, closes, frequency, window_years, expected_buys, tolerance):
+    buy_indices = purchase_schedule(days, frequency)
+    rolling = rolling_dca(days, closes, buy_indices, 1.0, round(window_years * NUM_OF_DAYS_IN_A_YEAR), frequency)
+    name = f"{window_years}-year {frequency.lower()}"
+    if len(rolling.invested) == 0:
+        yield f"{name}: no windows"
+        return
+
+    if expected_buys is not None:
+        counts = np.unique(rolling.invested)
+        if not np.array_equal(counts, [expected_buys]):
+            yield f"{name}: windows hold {counts.astype(int).tolist()} buys, expected {expected_buys}"
+
+    if frequency == DAILY:
+        # A daily window starts on its first buy, so it must be valued before that day plus its length
+        window_ends = days[rolling.start_indices] + np.timedelta64(round(window_years * NUM_OF_DAYS_IN_A_YEAR), "D")
+        late = np.count_nonzero(days[rolling.end_indices] >= window_ends)
+        if late:
+            yield f"{name}: {late} windows are valued on or after their end"
+
+    for window in range(0, len(rolling.invested), REFERENCE_STRIDE):
+        start, end = rolling.start_indices[window], rolling.end_indices[window]
+        window_buys = buy_indices[(buy_indices >= start) & (buy_indices <= end)] - start
+        expected = simulate_dca(closes[start:end + 1], window_buys, 1.0).value[-1]
+        if not abs(rolling.value[window] - expected) <= tolerance * expected:
+            yield f"{name} window from {days[start]}: value {rolling.value[window]!r} != {expected!r}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check rolling_dca's windows against single DCA simulations.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="largest allowed relative difference")
+    args = parser.parse_args()
+
+    days, closes = history()
+    failures = 0
+    for frequency, window_years, expected_buys in WINDOW_CASES:
+        for failure in window_failures(days, closes, frequency, window_years, expected_buys, args.tolerance):
+            failures += 1
+            print(failure)
+    print(f"{len(WINDOW_CASES)} window lengths over {days[0]} to {days[-1]}, {failures} failures")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import argparse
+import sys
+
+import numpy as np
+
+from utils.xirr import annuity_rate, xirr
+
+DEFAULT_TOLERANCE = 1e-9
+# (payment, number of payments, final value as a multiple of the total paid)
+ANNUITY_CASES = [(amount, periods, multiple)
+                 for amount in (1.0, 25.0, 1000.0)
+                 for periods in (2, 21, 63, 126, 252)
+                 for multiple in (0.6, 0.95, 1.0, 1.3, 2.5)]
+# (days between flows, amounts): a purchase every period, then the final value
+XIRR_CASES = [
+    (365, [-1000.0, -1000.0, -1000.0, -1000.0, 5200.0]),
+    (365, [-500.0, -250.0, -750.0, 1200.0]),
+    (30, [-100.0] * 24 + [2900.0]),
+    (30, [-100.0] * 36 + [2400.0]),
+    (7, [-10.0, -20.0, -5.0, -40.0, 90.0]),
+]
+
+
+def reference_irr(cash_flows):
+    # numpy_financial 1.0's irr, which the portfolio estimator used before XIRR: the real positive roots
+    # of the cash flow polynomial in 1 / (1 + r), keeping the rate closest to zero
+    roots = np.roots(np.asarray(cash_flows, dtype=np.float64)[::-1])
+    roots = roots[(roots.imag == 0) & (roots.real > 0)].real
+    if len(roots) == 0:
+        return np.nan
+    rates = 1 / roots - 1
+    return rates[np.argmin(np.abs(rates))]
+
+
+def annuity_differences():
+    # annuity_rate against the old daily cash flows: one payment per market day, the value one day later
+    for payment, periods, multiple in ANNUITY_CASES:
+        future_value = payment * periods * multiple
+        expected = reference_irr([-payment] * periods + [future_value])
+        yield f"annuity {payment:g} x {periods}, value {future_value:g}", annuity_rate(payment, periods, future_value), expected
+
+
+def xirr_differences():
+    # On equally spaced dates XIRR's annual rate is the per-period IRR compounded over 365 days
+    for spacing, amounts in XIRR_CASES:
+        dates = np.datetime64("2020-01-01") + np.arange(len(amounts)) * np.timedelta64(spacing, "D")
+        expected = (1 + reference_irr(amounts)) ** (365.0 / spacing) - 1
+        yield f"xirr every {spacing} days, {len(amounts)} flows", xirr(amounts, dates), expected
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check annuity_rate and xirr against the IRR they replaced.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="largest allowed absolute difference")
+    args = parser.parse_args()
+
+    failures = 0
+    worst = 0.0
+    for name, rate, expected in list(annuity_differences()) + list(xirr_differences()):
+        difference = abs(rate - expected)
+        worst = max(worst, difference)
+        if not difference <= args.tolerance:
+            failures += 1
+            print(f"{name}: {rate!r} != {expected!r} (difference {difference:.3g})")
+    print(f"{len(ANNUITY_CASES) + len(XIRR_CASES)} cases, largest difference {worst:.3g}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
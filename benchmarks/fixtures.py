@@ -0,0 +1,44 @@
+import gzip
+import json
+import os
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Endpoints whose fixtures hold a symbol's full history; the stub serves the slice a request's from/to asks for
+PRICE_ENDPOINTS = ("api/v3/historical-price-full", "api/v3/historical-chart")
+# Endpoints that take the symbol as a query parameter instead of a path segment
+SYMBOL_PARAMS = {"stable/income-statement": "symbol", "api/v3/stock_news": "tickers"}
+
+
+def fixture_key(path, params=None):
+    # "api/v3/profile/AAPL" -> "api/v3/profile/AAPL", ("stable/income-statement", {"symbol": "AAPL"}) -> ".../AAPL"
+    path = path.strip("/")
+    symbol_param = SYMBOL_PARAMS.get(path)
+    if symbol_param is not None and params and params.get(symbol_param):
+        path = f"{path}/{params[symbol_param]}"
+    return path
+
+
+def fixture_path(key, fixture_dir=FIXTURE_DIR):
+    return os.path.join(fixture_dir, key.replace("/", "__") + ".json.gz")
+
+
+def save_fixture(key, data, fixture_dir=FIXTURE_DIR):
+    os.makedirs(fixture_dir, exist_ok=True)
+    with open(fixture_path(key, fixture_dir), "wb") as file:
+        # A fixed mtime keeps rewritten fixtures byte-identical when their data is unchanged
+        with gzip.GzipFile(fileobj=file, mode="wb", mtime=0) as compressed:
+            compressed.write(json.dumps(data).encode())
+
+
+def load_fixture(key, fixture_dir=FIXTURE_DIR):
+    # Returns None when nothing was recorded for key
+    try:
+        with gzip.open(fixture_path(key, fixture_dir), "rt") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def has_fixtures(fixture_dir=FIXTURE_DIR):
+    return os.path.isdir(fixture_dir) and any(name.endswith(".json.gz") for name in os.listdir(fixture_dir))
@@ -0,0 +1,175 @@
+import argparse
+import gzip
+import json
+import random
+import threading
+import time
+import urllib.parse
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.fixtures import FIXTURE_DIR, PRICE_ENDPOINTS, fixture_key, load_fixture
+
+# Endpoints FMP serves for several comma-separated symbols at once
+BATCH_ENDPOINTS = ("api/v3/profile", "api/v3/quote")
+STATS_PATH = "/__stats"
+RESET_PATH = "/__reset"
+
+
+def endpoint_of(path):
+    # "api/v3/historical-chart/1min/AAPL" -> "historical-chart", matching the FMP client's endpoint names
+    parts = path.strip("/").split("/")
+    if parts[0] == "api":
+        parts = parts[2:]
+    elif parts[0] == "stable":
+        parts = parts[1:]
+    return parts[0] if parts else ""
+
+
+def _in_range(row, start, end):
+    day = row.get("date", "")[:10]
+    return (start is None or day >= start) and (end is None or day <= end)
+
+
+class FMPStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, fixture_dir=FIXTURE_DIR, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0,
+                 error_status=500, seed=None):
+        super().__init__(address, FMPStubHandler)
+        self.fixture_dir = fixture_dir
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.bytes_sent = 0
+        self.lock = threading.Lock()
+        self._fixtures = {}
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def fixture(self, key):
+        # Fixtures are decompressed once and kept in memory, so disk reads never show up as API latency
+        with self.lock:
+            if key not in self._fixtures:
+                self._fixtures[key] = load_fixture(key, self.fixture_dir)
+            return self._fixtures[key]
+
+    def stats(self):
+        with self.lock:
+            return {"calls": dict(self.calls), "total_calls": sum(self.calls.values()), "bytes_sent": self.bytes_sent}
+
+    def reset(self):
+        with self.lock:
+            self.calls.clear()
+            self.bytes_sent = 0
+
+    def respond(self, path, params):
+        # Returns (status, data) for an API request, the way FMP would answer it
+        key = fixture_key(path, params)
+        for batch_endpoint in BATCH_ENDPOINTS:
+            if key.startswith(batch_endpoint + "/") and "," in key:
+                records = []
+                for symbol in key[len(batch_endpoint) + 1:].split(","):
+                    records.extend(self.fixture(f"{batch_endpoint}/{symbol}") or [])
+                return 200, records
+
+        data = self.fixture(key)
+        start, end = params.get("from"), params.get("to")
+        if key.startswith(PRICE_ENDPOINTS):
+            if data is None:
+                return 200, {} if key.startswith("api/v3/historical-price-full") else []
+            if isinstance(data, dict):
+                return 200, dict(data, historical=[row for row in data.get("historical", []) if _in_range(row, start, end)])
+            return 200, [row for row in data if _in_range(row, start, end)]
+        if data is None:
+            return 200, []
+        if key.startswith("api/v3/stock_news"):
+            data = [article for article in data if start is None or article.get("publishedDate", "")[:10] >= start]
+        if isinstance(data, list) and params.get("limit"):
+            data = data[:int(params["limit"])]
+        return 200, data
+
+
+class FMPStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        params.pop("apikey", None)
+
+        if url.path == STATS_PATH:
+            return self._send(200, self.server.stats(), count=False)
+        if url.path == RESET_PATH:
+            self.server.reset()
+            return self._send(200, {}, count=False)
+
+        server = self.server
+        with server.lock:
+            server.calls[endpoint_of(url.path)] += 1
+            delay = server.latency_ms + server.random.uniform(0, server.jitter_ms)
+            fail = server.random.random() < server.error_rate
+        if delay:
+            time.sleep(delay / 1000)
+        if fail:
+            return self._send(server.error_status, {"Error Message": "Injected error"})
+        status, data = server.respond(url.path, params)
+        self._send(status, data)
+
+    def _send(self, status, data, count=True):
+        body = json.dumps(data).encode()
+        headers = {"Content-Type": "application/json"}
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, compresslevel=1)
+            headers["Content-Encoding"] = "gzip"
+        headers["Content-Length"] = str(len(body))
+
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        if count:
+            with self.server.lock:
+                self.server.bytes_sent += len(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub(host="127.0.0.1", port=0, **options):
+    # Serves in a daemon thread; port 0 picks a free port, see server.base_url
+    server = FMPStubServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve recorded FMP fixtures on a local port.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fixture-dir", default=FIXTURE_DIR)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay added to every API response")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="extra random delay, uniform in [0, jitter]")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of API requests that fail")
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    server = FMPStubServer((args.host, args.port), args.fixture_dir, args.latency_ms, args.jitter_ms,
+                           args.error_rate, args.error_status, args.seed)
+    print(f"Serving FMP fixtures from {args.fixture_dir} at {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
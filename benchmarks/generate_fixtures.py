@@ -0,0 +1,153 @@
+import argparse
+import hashlib
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from benchmarks.fixtures import FIXTURE_DIR, save_fixture
+
+NASDAQ_100_SYMBOLS = [
+    "AAPL", "ABNB", "ADBE", "ADI", "ADP", "ADSK", "AEP", "AMAT", "AMD", "AMGN", "AMZN", "ANSS", "ARM", "ASML",
+    "AVGO", "AZN", "BIIB", "BKNG", "BKR", "CCEP", "CDNS", "CDW", "CEG", "CHTR", "CMCSA", "COST", "CPRT", "CRWD",
+    "CSCO", "CSGP", "CSX", "CTAS", "CTSH", "DASH", "DDOG", "DLTR", "DXCM", "EA", "EXC", "FANG", "FAST", "FTNT",
+    "GEHC", "GFS", "GILD", "GOOG", "GOOGL", "HON", "IDXX", "ILMN", "INTC", "INTU", "ISRG", "KDP", "KHC", "KLAC",
+    "LIN", "LRCX", "LULU", "MAR", "MCHP", "MDB", "MDLZ", "MELI", "META", "MNST", "MRNA", "MRVL", "MSFT", "MU",
+    "NFLX", "NVDA", "NXPI", "ODFL", "ON", "ORLY", "PANW", "PAYX", "PCAR", "PDD", "PEP", "PYPL", "QCOM", "REGN",
+    "ROP", "ROST", "SBUX", "SMCI", "SNPS", "TEAM", "TMUS", "TSLA", "TTD", "TTWO", "TXN", "VRSK", "VRTX", "WBD",
+    "WDAY", "XEL", "ZS",
+]
+# The S&P 500 and screener universes reuse the NASDAQ-100 symbols plus these NYSE listings
+NYSE_SYMBOLS = [
+    "BRK-B", "JPM", "V", "MA", "UNH", "XOM", "JNJ", "PG", "HD", "KO", "WMT", "CVX", "MRK", "ABBV", "BAC", "CRM",
+    "ORCL", "MCD", "DIS", "NKE", "CAT", "GE", "IBM", "GS", "MS", "BA", "UPS", "LOW", "SPGI", "BLK",
+]
+SP_500_SYMBOLS = [symbol for symbol in NASDAQ_100_SYMBOLS if symbol not in {"ARM", "ASML", "AZN", "CCEP", "MELI", "PDD"}] + NYSE_SYMBOLS
+ETF_SYMBOLS = ["VOO", "QQQM"]
+# Only the symbols the benchmark scenarios chart get price histories, which dominate the fixture size
+PRICE_SYMBOLS = ["AAPL", "MSFT", "NVDA", "VOO", "QQQM"]
+HISTORY_START = date(2000, 1, 3)
+INTRADAY_SESSIONS = 10
+INTRADAY_INTERVALS = {"1min": 1, "5min": 5, "15min": 15, "30min": 30, "1hour": 60}
+NEWS_ARTICLES_PER_SYMBOL = 60
+
+
+def _rng(*parts):
+    # Seeded per symbol and dataset, so every run generates the same market
+    digest = hashlib.sha256("/".join(map(str, parts)).encode()).digest()
+    return np.random.default_rng(int.from_bytes(digest[:8], "little"))
+
+
+def _business_days(start, end):
+    days = np.arange(np.datetime64(start, "D"), np.datetime64(end, "D") + 1)
+    return days[np.is_busday(days)]
+
+
+def _random_walk(rng, count, start_price):
+    returns = rng.normal(0.0004, 0.018, count)
+    return start_price * np.exp(np.cumsum(returns))
+
+
+def daily_history(symbol, today):
+    rng = _rng(symbol, "daily")
+    days = _business_days(HISTORY_START, today - timedelta(days=1))
+    closes = _random_walk(rng, len(days), rng.uniform(5, 50))
+    opens = closes * (1 + rng.normal(0, 0.005, len(days)))
+    highs = np.maximum(opens, closes) * (1 + rng.uniform(0, 0.01, len(days)))
+    lows = np.minimum(opens, closes) * (1 - rng.uniform(0, 0.01, len(days)))
+    volumes = rng.integers(1_000_000, 80_000_000, len(days))
+    # FMP lists the newest day first
+    historical = [{"date": str(day), "open": round(o, 4), "high": round(h, 4), "low": round(l, 4),
+                   "close": round(c, 4), "adjClose": round(c, 4), "volume": int(v)}
+                  for day, o, h, l, c, v in zip(days, opens, highs, lows, closes, volumes)][::-1]
+    return {"symbol": symbol, "historical": historical}
+
+
+def intraday_history(symbol, interval_minutes, today):
+    rng = _rng(symbol, "intraday", interval_minutes)
+    days = _business_days(today - timedelta(days=INTRADAY_SESSIONS * 2), today - timedelta(days=1))[-INTRADAY_SESSIONS:]
+    bars_per_day = 390 // interval_minutes
+    closes = _random_walk(rng, len(days) * bars_per_day, 100.0)
+    rows = []
+    for i, day in enumerate(days):
+        session_open = datetime.fromisoformat(f"{day}T09:30:00")
+        for j in range(bars_per_day):
+            close = closes[i * bars_per_day + j]
+            rows.append({"date": (session_open + timedelta(minutes=interval_minutes * j)).strftime("%Y-%m-%d %H:%M:%S"),
+                         "open": round(close * 0.999, 4), "low": round(close * 0.998, 4),
+                         "high": round(close * 1.002, 4), "close": round(close, 4), "volume": int(rng.integers(10_000, 1_000_000))})
+    return rows[::-1]
+
+
+def company_fixtures(symbol, today, is_etf=False):
+    rng = _rng(symbol, "company")
+    price = round(float(rng.uniform(20, 900)), 2)
+    revenue = float(rng.uniform(2e9, 4e11))
+    net_income = revenue * float(rng.uniform(-0.05, 0.35))
+    income_statement = [{"date": f"{today.year - 1 - i}-12-31", "symbol": symbol, "revenue": revenue * (0.9 ** i),
+                         "netIncome": net_income * (0.9 ** i)} for i in range(5)]
+    analyst_counts = rng.integers(0, 25, 5)
+    return {
+        f"api/v3/profile/{symbol}": [{
+            "symbol": symbol, "companyName": f"{symbol} Holdings", "price": price,
+            "mktCap": price * float(rng.uniform(1e8, 1.5e10)), "isEtf": is_etf, "isFund": False,
+            "isActivelyTrading": True, "exchangeShortName": "NASDAQ", "sector": "Technology",
+        }],
+        f"api/v3/quote/{symbol}": [{"symbol": symbol, "name": f"{symbol} Holdings", "price": price,
+                                    "volume": int(rng.integers(1_000_000, 80_000_000)), "exchange": "NASDAQ"}],
+        f"api/v3/rating/{symbol}": [{
+            "symbol": symbol, "rating": "B", "ratingScore": int(rng.integers(1, 6)),
+            **{f"ratingDetails{name}Score": int(rng.integers(1, 6)) for name in ("DCF", "ROE", "ROA", "DE", "PE", "PB")},
+        }],
+        f"api/v3/analyst-stock-recommendations/{symbol}": [{
+            "symbol": symbol, "date": str(today),
+            "analystRatingsStrongBuy": int(analyst_counts[0]) + 1, "analystRatingsbuy": int(analyst_counts[1]),
+            "analystRatingsHold": int(analyst_counts[2]), "analystRatingsSell": int(analyst_counts[3]),
+            "analystRatingsStrongSell": int(analyst_counts[4]),
+        }],
+        f"api/v3/income-statement/{symbol}": income_statement,
+        f"stable/income-statement/{symbol}": income_statement,
+        f"api/v3/key-metrics/{symbol}": [{"symbol": symbol, "peRatio": float(rng.uniform(8, 60)),
+                                          "researchAndDdevelopementToRevenue": float(rng.uniform(0, 0.25)),
+                                          "freeCashFlowYield": float(rng.uniform(-0.02, 0.08))}],
+        f"api/v3/discounted-cash-flow/{symbol}": [{"symbol": symbol, "date": str(today),
+                                                   "dcf": price * float(rng.uniform(0.6, 1.5)), "Stock Price": price}],
+        f"api/v3/stock_news/{symbol}": [{
+            "symbol": symbol, "publishedDate": (datetime.combine(today, datetime.min.time()) - timedelta(hours=6 * i)).strftime("%Y-%m-%d %H:%M:%S"),
+            "title": f"{symbol} shares {'rise' if i % 3 else 'slip'} as analysts weigh quarterly results {i}",
+            "text": f"Investors reacted to the latest update from {symbol}. " * 8,
+            "url": f"https://news.example.com/{symbol.lower()}/{i}", "site": "example.com",
+        } for i in range(NEWS_ARTICLES_PER_SYMBOL)],
+    }
+
+
+def generate(fixture_dir=FIXTURE_DIR, today=None):
+    today = today or date.today()
+    save_fixture("api/v3/nasdaq_constituent",
+                 [{"symbol": symbol, "name": f"{symbol} Holdings", "sector": "Technology"} for symbol in NASDAQ_100_SYMBOLS],
+                 fixture_dir)
+    save_fixture("api/v3/sp500_constituent",
+                 [{"symbol": symbol, "name": f"{symbol} Holdings", "sector": "Technology"} for symbol in SP_500_SYMBOLS],
+                 fixture_dir)
+    save_fixture("api/v3/stock-screener",
+                 [{"symbol": symbol, "companyName": f"{symbol} Holdings", "isEtf": False, "isFund": False,
+                   "isActivelyTrading": True, "country": "US"} for symbol in NASDAQ_100_SYMBOLS + NYSE_SYMBOLS],
+                 fixture_dir)
+    for symbol in NASDAQ_100_SYMBOLS + NYSE_SYMBOLS + ETF_SYMBOLS:
+        for key, data in company_fixtures(symbol, today, is_etf=symbol in ETF_SYMBOLS).items():
+            save_fixture(key, data, fixture_dir)
+    for symbol in PRICE_SYMBOLS:
+        save_fixture(f"api/v3/historical-price-full/{symbol}", daily_history(symbol, today), fixture_dir)
+        for interval, minutes in INTRADAY_INTERVALS.items():
+            save_fixture(f"api/v3/historical-chart/{interval}/{symbol}", intraday_history(symbol, minutes, today), fixture_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write deterministic synthetic FMP fixtures for the benchmarks.")
+    parser.add_argument("--fixture-dir", default=FIXTURE_DIR)
+    args = parser.parse_args()
+    generate(args.fixture_dir)
+    print(f"Wrote synthetic fixtures to {args.fixture_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import argparse
+from datetime import date
+
+from benchmarks.fixtures import FIXTURE_DIR, fixture_key, save_fixture
+from benchmarks.generate_fixtures import ETF_SYMBOLS, HISTORY_START, INTRADAY_INTERVALS, PRICE_SYMBOLS
+from utils.fetch_engine import fetch_all
+from utils.fmp_client import fmp_get
+from utils.ranking import NASDAQ_100, UNIVERSE_ENDPOINTS
+
+# Every per-symbol request the app makes, as (path, params); price requests ask for the full history
+COMPANY_REQUESTS = [
+    lambda symbol: (f"api/v3/profile/{symbol}", None),
+    lambda symbol: (f"api/v3/quote/{symbol}", None),
+    lambda symbol: (f"api/v3/rating/{symbol}", None),
+    lambda symbol: (f"api/v3/analyst-stock-recommendations/{symbol}", None),
+    lambda symbol: (f"api/v3/income-statement/{symbol}", {"limit": 5}),
+    lambda symbol: ("stable/income-statement", {"symbol": symbol}),
+    lambda symbol: (f"api/v3/key-metrics/{symbol}", {"period": "annual"}),
+    lambda symbol: (f"api/v3/discounted-cash-flow/{symbol}", None),
+    lambda symbol: ("api/v3/stock_news", {"tickers": symbol, "limit": 100}),
+]
+
+
+def price_requests(symbol, today):
+    requests = [(f"api/v3/historical-price-full/{symbol}", {"from": HISTORY_START.isoformat(), "to": today.isoformat()})]
+    requests += [(f"api/v3/historical-chart/{interval}/{symbol}", None) for interval in INTRADAY_INTERVALS]
+    return requests
+
+
+def record(symbols, price_symbols, universe=NASDAQ_100, fixture_dir=FIXTURE_DIR):
+    # Saves live FMP responses as fixtures; needs a real fmp_api_key and spends roughly
+    # len(COMPANY_REQUESTS) requests per symbol of quota
+    today = date.today()
+    path, params = UNIVERSE_ENDPOINTS[universe]
+    constituents = fmp_get(path, params, use_cache=False)
+    save_fixture(fixture_key(path, params), constituents, fixture_dir)
+
+    symbols = symbols or [constituent["symbol"] for constituent in constituents] + ETF_SYMBOLS
+    jobs = [request(symbol) for symbol in symbols for request in COMPANY_REQUESTS]
+    jobs += [request for symbol in price_symbols for request in price_requests(symbol, today)]
+
+    def fetch(job):
+        path, params = job[0], dict(job[1])
+        save_fixture(fixture_key(path, params), fmp_get(path, params, use_cache=False), fixture_dir)
+
+    _, errors = fetch_all(fetch, [(path, tuple(sorted((params or {}).items()))) for path, params in jobs])
+    for (path, params), error in errors.items():
+        print(f"Error recording {path} {dict(params)}: {error}")
+    print(f"Recorded {len(jobs) - len(errors)} of {len(jobs)} fixtures to {fixture_dir}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record live FMP responses as benchmark fixtures.")
+    parser.add_argument("--symbols", nargs="*", default=None, help="defaults to the universe plus the ETFs")
+    parser.add_argument("--price-symbols", nargs="*", default=PRICE_SYMBOLS)
+    parser.add_argument("--universe", choices=sorted(UNIVERSE_ENDPOINTS), default=NASDAQ_100)
+    parser.add_argument("--fixture-dir", default=FIXTURE_DIR)
+    args = parser.parse_args()
+    record(args.symbols, args.price_symbols, args.universe, args.fixture_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import requests
+from huggingface_hub import try_to_load_from_cache
+
+from benchmarks.fixtures import FIXTURE_DIR, has_fixtures
+from benchmarks.fmp_stub import RESET_PATH, STATS_PATH, start_stub
+from benchmarks.generate_fixtures import generate
+from benchmarks.scenarios import SCENARIOS
+from utils import sentiment
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_WARM_RUNS = 3
+DEFAULT_TIMEOUT = 180
+DEFAULT_MAX_REGRESSION = 0.25
+RESULT_PREFIX = "BENCHMARK_RESULT "
+# Scenarios that score news with FinBERT. Children run with the Hugging Face hub offline, so these need
+# the model in the local cache (python -m benchmarks.run --cache-model) rather than downloading it mid-run.
+MODEL_SCENARIOS = {"stock_analyzer"}
+MODEL_FILES = ("config.json", "vocab.txt")
+MODEL_WEIGHT_FILES = ("model.safetensors", "pytorch_model.bin")
+METRICS = ("cold_seconds", "warm_seconds", "cold_calls", "warm_calls", "cold_peak_mb", "warm_peak_mb")
+
+
+def _is_cached(filename):
+    return isinstance(try_to_load_from_cache(sentiment.MODEL_NAME, filename), str)
+
+
+def model_is_cached():
+    return all(_is_cached(filename) for filename in MODEL_FILES) and any(map(_is_cached, MODEL_WEIGHT_FILES))
+
+
+def cache_model():
+    # Downloads FinBERT the way the app loads it, so every file it reads ends up in the local cache
+    sentiment.load_tokenizer()
+    sentiment.load_finbert_model()
+
+
+def _run_once(name, timeout, trace_memory):
+    # Runs a scenario in this process against the stub at FMP_BASE_URL and measures it
+    from streamlit.testing.v1 import AppTest
+
+    script, drive = SCENARIOS[name]
+    base_url = os.environ["FMP_BASE_URL"]
+    requests.get(base_url + RESET_PATH, timeout=5)
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    at = drive(AppTest.from_file(os.path.join(PROJECT_ROOT, script), default_timeout=timeout))
+    seconds = time.perf_counter() - start
+    peak_mb = None
+    if trace_memory:
+        peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    stats = requests.get(base_url + STATS_PATH, timeout=5).json()
+    errors = [str(element.value) for element in list(at.exception) + list(at.error)]
+    return {"seconds": seconds, "calls": stats["total_calls"], "calls_by_endpoint": stats["calls"],
+            "bytes": stats["bytes_sent"], "peak_mb": peak_mb, "errors": errors}
+
+
+def run_child(name, warm_runs, timeout, trace_memory):
+    # The first run starts from an empty cache directory and a fresh process, later runs reuse both
+    cold = _run_once(name, timeout, trace_memory)
+    warm = [_run_once(name, timeout, trace_memory) for _ in range(warm_runs)]
+    print(RESULT_PREFIX + json.dumps({"cold": cold, "warm": warm}))
+
+
+def run_scenario(name, base_url, warm_runs, timeout, trace_memory):
+    with tempfile.TemporaryDirectory(prefix="fmp-benchmark-") as cache_dir:
+        env = dict(os.environ, FMP_BASE_URL=base_url, FMP_API_KEY="benchmark", CACHE_DIR=cache_dir,
+                   HF_HUB_OFFLINE="1", TRANSFORMERS_OFFLINE="1",
+                   PYTHONPATH=os.pathsep.join(filter(None, [PROJECT_ROOT, os.environ.get("PYTHONPATH")])))
+        command = [sys.executable, "-m", "benchmarks.run", "--child", name, "--warm-runs", str(warm_runs),
+                   "--timeout", str(timeout)]
+        if trace_memory:
+            command.append("--trace-memory")
+        completed = subprocess.run(command, cwd=PROJECT_ROOT, env=env, capture_output=True, text=True)
+
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    raise RuntimeError(f"Scenario {name} crashed:\n{completed.stderr[-2000:]}")
+
+
+def benchmark(names, base_url, warm_runs, timeout, measure_memory):
+    results = {}
+    for name in names:
+        timed = run_scenario(name, base_url, warm_runs, timeout, trace_memory=False)
+        result = {
+            "cold_seconds": timed["cold"]["seconds"],
+            "warm_seconds": statistics.median(run["seconds"] for run in timed["warm"]) if timed["warm"] else None,
+            "cold_calls": timed["cold"]["calls"],
+            "warm_calls": max((run["calls"] for run in timed["warm"]), default=None),
+            "cold_calls_by_endpoint": timed["cold"]["calls_by_endpoint"],
+            "cold_bytes": timed["cold"]["bytes"],
+            "errors": sorted(set(timed["cold"]["errors"]).union(*(run["errors"] for run in timed["warm"]))),
+        }
+        # tracemalloc slows allocation-heavy code down several times, so memory gets its own runs
+        if measure_memory:
+            traced = run_scenario(name, base_url, min(warm_runs, 1), timeout, trace_memory=True)
+            result["cold_peak_mb"] = traced["cold"]["peak_mb"]
+            result["warm_peak_mb"] = traced["warm"][0]["peak_mb"] if traced["warm"] else None
+        results[name] = result
+        print(f"  {name}: cold {result['cold_seconds']:.2f}s, {result['cold_calls']} calls", file=sys.stderr)
+    return results
+
+
+def _format(value, metric):
+    if value is None:
+        return "-"
+    if metric.endswith("seconds"):
+        return f"{value:.2f}"
+    if metric.endswith("mb"):
+        return f"{value:.1f}"
+    return str(value)
+
+
+def print_report(results):
+    header = ["scenario"] + list(METRICS) + ["errors"]
+    rows = [[name] + [_format(result.get(metric), metric) for metric in METRICS] + [str(len(result["errors"]))]
+            for name, result in results.items()]
+    widths = [max(len(row[i]) for row in [header] + rows) for i in range(len(header))]
+    for row in [header] + rows:
+        print("  ".join(cell.ljust(width) if i == 0 else cell.rjust(width) for i, (cell, width) in enumerate(zip(row, widths))))
+    for name, result in results.items():
+        for error in result["errors"]:
+            print(f"{name}: {error.splitlines()[0][:200]}")
+
+
+def find_regressions(results, baseline, max_regression):
+    # Latencies and memory may grow by max_regression before they count; any extra API call counts
+    regressions = []
+    for name, result in results.items():
+        for metric in METRICS:
+            current, previous = result.get(metric), baseline.get(name, {}).get(metric)
+            if current is None or previous is None:
+                continue
+            limit = previous if metric.endswith("calls") else previous * (1 + max_regression)
+            if current > limit:
+                regressions.append(f"{name} {metric}: {_format(previous, metric)} -> {_format(current, metric)}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the app's pages against a local FMP stub.")
+    parser.add_argument("scenarios", nargs="*", help=f"scenarios to run, all by default: {', '.join(SCENARIOS)}")
+    parser.add_argument("--warm-runs", type=int, default=DEFAULT_WARM_RUNS)
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="seconds allowed per page run")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc runs")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay the stub adds to every API response")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of API requests the stub fails")
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fixture-dir", default=FIXTURE_DIR)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results file of an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=DEFAULT_MAX_REGRESSION,
+                        help="allowed relative growth in latency and memory before a run fails")
+    parser.add_argument("--cache-model", action="store_true",
+                        help="download FinBERT into the local Hugging Face cache for the stock_analyzer scenario and exit")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--trace-memory", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.warm_runs, args.timeout, args.trace_memory)
+        return
+
+    if args.cache_model:
+        cache_model()
+        return
+
+    names = args.scenarios or list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    needs_model = sorted(MODEL_SCENARIOS.intersection(names))
+    if needs_model and not model_is_cached():
+        parser.error(f"{sentiment.MODEL_NAME} is not in the local Hugging Face cache, which {', '.join(needs_model)} "
+                     f"needs. Run python -m benchmarks.run --cache-model once with network access, "
+                     f"or leave out {', '.join(needs_model)}.")
+
+    if not has_fixtures(args.fixture_dir):
+        print(f"No fixtures in {args.fixture_dir}, generating synthetic ones", file=sys.stderr)
+        generate(args.fixture_dir)
+
+    stub = start_stub(fixture_dir=args.fixture_dir, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                      error_rate=args.error_rate, error_status=args.error_status, seed=args.seed)
+    try:
+        results = benchmark(names, stub.base_url, args.warm_runs, args.timeout,
+                            not args.no_memory)
+    finally:
+        stub.shutdown()
+
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = find_regressions(results, json.load(file), args.max_regression)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# Each scenario drives one page the way a user would: (script, function that takes the freshly
+# created AppTest and returns it after the interactions). The first at.run() renders the page as opened.
+
+def recommend_etf(at):
+    # The default answers score 1, which charts the VOO ETF
+    return at.run()
+
+
+def recommend_nasdaq100(at):
+    at.run()
+    at.radio[0].set_value("7+ years")
+    at.radio[1].set_value("Greater than 14% CAGR")
+    at.select_slider[0].set_value("High")
+    return at.run()
+
+
+def recommend_sp500(at):
+    recommend_nasdaq100(at)
+    at.selectbox[0].set_value("sp500")
+    return at.run()
+
+
+def analyze_stock(at):
+    at.run()
+    at.text_input[0].input("AAPL")
+    return at.run()
+
+
+def estimate_portfolio_value(at):
+    at.run()
+    at.text_input[0].input("AAPL")
+    at.run()
+    at.button[0].click()
+    return at.run()
+
+
+def backtest_portfolio(at):
+    at.run()
+    at.text_input[0].input("AAPL, MSFT, NVDA")
+    at.run()
+    at.button[0].click()
+    return at.run()
+
+
+def project_retirement(at):
+    at.run()
+    at.button[0].click()
+    return at.run()
+
+
+def simulate_retirement(at):
+    at.run()
+    at.checkbox[0].check()
+    at.run()
+    at.button[0].click()
+    return at.run()
+
+
+SCENARIOS = {
+    "recommender_etf": ("stock_portfolio_recommender.py", recommend_etf),
+    "recommender_nasdaq100": ("stock_portfolio_recommender.py", recommend_nasdaq100),
+    "recommender_sp500": ("stock_portfolio_recommender.py", recommend_sp500),
+    "stock_analyzer": ("pages/stock_analyzer.py", analyze_stock),
+    "portfolio_value_estimator": ("pages/portfolio_value_estimator.py", estimate_portfolio_value),
+    "portfolio_backtester": ("pages/portfolio_backtester.py", backtest_portfolio),
+    "retirement_calculator": ("pages/retirement_calculator.py", project_retirement),
+    "retirement_monte_carlo": ("pages/retirement_calculator.py", simulate_retirement),
+}
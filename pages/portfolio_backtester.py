@@ -0,0 +1,130 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from dateutil.relativedelta import relativedelta
+
+from utils import metrics
+from utils.backtest import align_closes, attribution, run_backtest
+from utils.dca import DAILY, MONTHLY, YEARLY
+from utils.fetch_engine import fetch_all
+from utils.fmp_batch import fetch_profiles
+from utils.price_store import get_prices
+
+DEFAULT_SYMBOLS = "AAPL, MSFT, NVDA, AMZN, GOOGL"
+
+
+def parse_symbols(text):
+    symbols = []
+    for symbol in text.replace(" ", "").upper().split(","):
+        if symbol and symbol not in symbols:
+            symbols.append(symbol)
+    return symbols
+
+
+def parse_weights(text, num_of_symbols):
+    if not text.strip():
+        return np.ones(num_of_symbols)
+    weights = np.array([float(weight) for weight in text.replace(" ", "").split(",") if weight])
+    if len(weights) != num_of_symbols or (weights < 0).any() or weights.sum() == 0:
+        raise ValueError(f"Please enter {num_of_symbols} non-negative weights, one per ticker symbol.")
+    return weights
+
+
+@metrics.traced_page
+def main():
+    st.title("Portfolio Backtester")
+    st.write("Backtest dollar cost averaging into a basket of stocks, split by weight on every contribution.")
+
+    default_symbols = ", ".join(st.session_state.get("recommended_symbols", [])) or DEFAULT_SYMBOLS
+    symbols = parse_symbols(st.text_input("Ticker symbols, separated by commas:", value=default_symbols))
+    weights_text = st.text_input("Weights, separated by commas (leave empty to invest equally):", value="")
+
+    default_start_date = datetime.date.today() - relativedelta(years=10)
+    start_date = st.date_input("Select the start date:", value=default_start_date)
+    end_date = st.date_input("Select the end date:", value=datetime.date.today())
+
+    frequency = st.selectbox("How often will you contribute?", [MONTHLY, DAILY, YEARLY])
+    amount = st.number_input(f"Amount invested per contribution ({frequency.lower()}): $", min_value=1.0, value=1000.0, step=100.0)
+
+    if symbols and st.button("Run Backtest"):
+        try:
+            weights = parse_weights(weights_text, len(symbols))
+        except ValueError as e:
+            st.error(str(e))
+            st.stop()
+
+        # Every ticker is checked with one multi-symbol profile request before any prices are fetched
+        with st.spinner("Checking ticker symbols..."):
+            profiles = fetch_profiles(symbols)
+        unknown_symbols = [symbol for symbol in symbols if symbol not in profiles]
+        if unknown_symbols:
+            st.error(f"Invalid ticker symbol or no data available: {', '.join(unknown_symbols)}")
+            st.stop()
+
+        # There are no closes after today, and the backtest ends on its last close
+        end_date = min(end_date, datetime.date.today())
+        with st.spinner("Loading price history..."):
+            prices, errors = fetch_all(lambda symbol: get_prices(symbol, '1day', start_date, end_date), symbols)
+        missing_symbols = [symbol for symbol in symbols if symbol in errors or len(prices.get(symbol, [])) == 0]
+        if missing_symbols:
+            st.error(f"No stock data available for: {', '.join(missing_symbols)}")
+            st.stop()
+
+        symbols, dates, closes = align_closes({symbol: prices[symbol] for symbol in symbols}, start_date, end_date)
+        if len(dates) == 0:
+            st.error("The selected stocks have no common trading history in the specified period.")
+            st.stop()
+
+        result = run_backtest(symbols, dates, closes, weights, frequency, amount)
+        invested_amount = result.invested[-1]
+        portfolio_value = result.value[-1]
+        profit = portfolio_value - invested_amount
+
+        st.markdown(
+            f"""
+            <div style="background-color: #d4edda; padding: 20px; border-radius: 5px; color: black;">
+                <h3>Results</h3>
+                <p>Backtest period: <strong>{dates[0]}</strong> to <strong>{dates[-1]}</strong></p>
+                <p>Amount invested: <strong>${invested_amount:,.2f}</strong></p>
+                <p>Portfolio value: <strong>${portfolio_value:,.2f}</strong></p>
+                <p>Profit: <strong>${profit:,.2f}</strong> ({(portfolio_value / invested_amount - 1) * 100:,.2f}%)</p>
+                <p>Annualized Internal Rate of Return = <strong>{result.annual_irr * 100:,.2f}%</strong></p>
+                <p>Maximum drawdown: <strong>{result.drawdown.min() * 100:,.2f}%</strong></p>
+            </div>
+            """,
+            unsafe_allow_html=True
+        )
+
+        with metrics.span("chart_build", chart="backtest"):
+            index = pd.DatetimeIndex(dates, name="Date")
+            st.subheader("Portfolio Value")
+            st.line_chart(pd.DataFrame({"Portfolio value": result.value, "Amount invested": result.invested}, index=index))
+
+            st.subheader("Drawdown")
+            st.area_chart(pd.DataFrame({"Drawdown (%)": result.drawdown * 100}, index=index))
+
+        st.subheader("Attribution")
+        st.dataframe(
+            pd.DataFrame(attribution(result)).style.format({
+                "Invested": "${:,.2f}",
+                "Final Value": "${:,.2f}",
+                "Profit": "${:,.2f}",
+                "Share of Profit": "{:.2%}",
+            }),
+            hide_index=True
+        )
+
+    st.markdown("---")
+    st.markdown("""
+    **Disclaimer:** This backtester shows how a portfolio would have performed on historical data. The results should not 
+    be considered as financial advice. Past performance does not guarantee future results, and the backtest does not 
+    account for fees, taxes, dividends or slippage. Market investments carry risk, and you may lose some or all of your 
+    invested capital. The creators and operators of this tool are not responsible for any financial losses or decisions 
+    made based on these calculations.
+    """)
+
+
+if __name__ == "__main__":
+    main()
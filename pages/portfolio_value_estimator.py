@@ -1,27 +1,83 @@
 import streamlit as st
-import requests
 import pandas as pd
-import pandas_market_calendars as mcal
-import numpy_financial as npf
+import numpy as np
 import datetime
+import plotly.graph_objects as go
+from utils import metrics
+from utils.dca import DAILY, MONTHLY, YEARLY, purchase_schedule, rolling_dca, simulate_dca
+from utils.fmp_batch import get_profile
+from utils.fmp_client import FMPError
+from utils.price_store import get_prices
 from utils.shared_functions import is_market_open, get_previous_market_day
+from utils.trading_calendar import count_sessions
+from utils.xirr import annuity_rate, xirr
 from dateutil.relativedelta import relativedelta
 
 # Constants
 NUM_OF_MARKET_DAYS_IN_A_YEAR = 252
-NUM_OF_MONTHS_IN_A_YEAR = 12
-SUCCESSFUL_REQUEST = 200
+NUM_OF_DAYS_IN_A_YEAR = 365.25
+DEFAULT_ROLLING_WINDOW_YEARS = 5
+ROLLING_PERCENTILES = (("Worst", 0), ("5th percentile", 5), ("25th percentile", 25), ("Median", 50),
+                       ("75th percentile", 75), ("95th percentile", 95), ("Best", 100))
 
 
 # Function to calculate annualized IRR
-def calculate_annualized_irr(daily_investment_amount, closing_prices, portfolio_value):
-    cash_flows = [-daily_investment_amount] * len(closing_prices)
-    cash_flows.append(portfolio_value)
-    irr = npf.irr(cash_flows)
-    annual_irr = ((1 + irr) ** NUM_OF_MARKET_DAYS_IN_A_YEAR) - 1
+def calculate_annualized_irr(dates, contributions, portfolio_value, valuation_date):
+    buy_indices = np.flatnonzero(contributions)
+    amounts = contributions[buy_indices]
+
+    if len(buy_indices) == len(contributions) and (amounts == amounts[0]).all():
+        # A constant amount bought every market day is an annuity in market-day periods, so it can be
+        # solved without evaluating one cash flow per day, and gives the same rate as an IRR over them
+        deferral_periods = max(0, count_sessions(dates[-1], valuation_date) - 2)
+        daily_irr = annuity_rate(amounts[0], len(amounts), portfolio_value, deferral_periods)
+        annual_irr = ((1 + daily_irr) ** NUM_OF_MARKET_DAYS_IN_A_YEAR) - 1
+    else:
+        annual_irr = xirr(np.append(-amounts, portfolio_value), np.append(dates[buy_indices], valuation_date))
     return annual_irr * 100
 
 
+def display_rolling_windows(ticker_symbol, frequency, investment_amount, window_years, end_date):
+    # Every window_years-long DCA over the ticker's full price history, one window per scheduled buy
+    try:
+        prices = get_prices(ticker_symbol, '1day', None, end_date)
+    except FMPError:
+        st.error("Could not fetch the price history for the rolling windows.")
+        return
+    dates = prices['date'].astype('datetime64[D]')
+    with metrics.span("rolling_dca", frequency=frequency):
+        rolling = rolling_dca(dates, prices['close'], purchase_schedule(dates, frequency), investment_amount,
+                              round(window_years * NUM_OF_DAYS_IN_A_YEAR), frequency)
+
+    st.subheader(f"Every {window_years}-year {frequency.lower()} DCA window")
+    if len(rolling.returns) == 0:
+        st.warning(f"The price history of {ticker_symbol} is shorter than {window_years} years.")
+        return
+    st.write(f"{len(rolling.returns):,} windows starting between {dates[rolling.start_indices[0]]} and "
+             f"{dates[rolling.start_indices[-1]]}, each valued on its last market day.")
+
+    with metrics.span("chart_build", chart="rolling_dca"):
+        fig = go.Figure(go.Histogram(x=rolling.returns * 100, nbinsx=50))
+        fig.update_layout(xaxis_title="Rate of return (%)", yaxis_title="Number of windows", bargap=0.05)
+        st.plotly_chart(fig, use_container_width=True)
+
+    # The windows at each percentile of the return, so their dates can be shown
+    order = np.argsort(rolling.returns, kind="stable")
+    rows = []
+    for label, percentile in ROLLING_PERCENTILES:
+        window = order[round(percentile / 100 * (len(order) - 1))]
+        rows.append({
+            "Window": label,
+            "Start": dates[rolling.start_indices[window]],
+            "End": dates[rolling.end_indices[window]],
+            "Amount invested": f"${rolling.invested[window]:,.2f}",
+            "Portfolio value": f"${rolling.value[window]:,.2f}",
+            "Rate of return": f"{rolling.returns[window] * 100:,.2f}%",
+        })
+    st.dataframe(pd.DataFrame(rows), hide_index=True)
+
+
+@metrics.traced_page
 def main():
     st.title("Portfolio Value Estimator")
 
@@ -29,18 +85,9 @@ def main():
 
     # Only proceed if ticker_symbol is provided
     if ticker_symbol:
-        api_key = st.secrets["fmp_api_key"]
-        url = f"https://financialmodelingprep.com/api/v3/profile/{ticker_symbol}?apikey={api_key}"
-        response = requests.get(url)
-        
-        if response.status_code != SUCCESSFUL_REQUEST:
-            st.error("Invalid ticker symbol or no data available.")
-            st.stop()
-            
-        stock_info = response.json()
         try:
-            company_name = stock_info[0]['companyName']
-        except (KeyError, IndexError):
+            company_name = get_profile(ticker_symbol)['companyName']
+        except (FMPError, KeyError):
             st.error("Invalid ticker symbol or no data available.")
             st.stop()
 
@@ -51,30 +98,36 @@ def main():
         # Input for investment frequency
         frequency = st.selectbox(
             "Are you planning to invest daily, monthly, or yearly?",
-            ["Daily", "Monthly", "Yearly"]
+            [DAILY, MONTHLY, YEARLY]
         )
 
         # Input for investment amount based on frequency
-        if frequency == "Daily":
-            daily_investment_amount = st.number_input(
+        if frequency == DAILY:
+            investment_amount = st.number_input(
                 "Please enter the amount you are planning to invest daily: $",
                 min_value=1.00,
                 step=0.50
             )
-        elif frequency == "Monthly":
-            monthly_investment_amount = st.number_input(
-                "Please enter the amount you are planning to invest monthly: $",
+        elif frequency == MONTHLY:
+            investment_amount = st.number_input(
+                "Please enter the amount you are planning to invest monthly (on the first market day of each month): $",
                 min_value=1.00,
                 step=10.0
             )
-            daily_investment_amount = (monthly_investment_amount * NUM_OF_MONTHS_IN_A_YEAR) / NUM_OF_MARKET_DAYS_IN_A_YEAR
-        elif frequency == "Yearly":
-            yearly_investment_amount = st.number_input(
-                "Please enter the amount you are planning to invest yearly: $",
+        elif frequency == YEARLY:
+            investment_amount = st.number_input(
+                "Please enter the amount you are planning to invest yearly (on the first market day of each year): $",
                 min_value=10.0,
                 step=100.0
             )
-            daily_investment_amount = yearly_investment_amount / NUM_OF_MARKET_DAYS_IN_A_YEAR
+
+        show_rolling_windows = st.checkbox(
+            "Also show every N-year DCA window in the stock's history",
+            help=f"One window starts on each scheduled purchase date; N defaults to {DEFAULT_ROLLING_WINDOW_YEARS} years."
+        )
+        if show_rolling_windows:
+            window_years = st.number_input("N, the length of each window (years):", min_value=1, max_value=30,
+                                           value=DEFAULT_ROLLING_WINDOW_YEARS, step=1)
 
         # Add Calculate button
         if st.button("Calculate Portfolio Value"):
@@ -89,60 +142,56 @@ def main():
             ten_days_before_today = today_date - datetime.timedelta(days=10)
 
             # Fetch stock data
-            url = f"https://financialmodelingprep.com/api/v3/historical-price-full/{ticker_symbol}?from={adjusted_start_date}&to={end_date}&apikey={api_key}"
-            response = requests.get(url)
-            
-            if response.status_code != SUCCESSFUL_REQUEST:
+            try:
+                prices = get_prices(ticker_symbol, '1day', adjusted_start_date, end_date)
+            except FMPError:
                 st.error("No stock data available for the specified period.")
                 st.stop()
                 
-            stock_data = response.json()
-            if 'historical' not in stock_data or not stock_data['historical']:
+            if len(prices) == 0:
                 st.error("No stock data available for the specified period.")
                 st.stop()
                 
-            historical_data = pd.DataFrame(stock_data['historical'])
-            historical_data['date'] = pd.to_datetime(historical_data['date'])
-            historical_data.set_index('date', inplace=True)
-            historical_data.sort_index(inplace=True)
-
-            # Fetch recent data for today's value
-            url_recent = f"https://financialmodelingprep.com/api/v3/historical-price-full/{ticker_symbol}?from={ten_days_before_today}&to={today_date}&apikey={api_key}"
-            response_recent = requests.get(url_recent)
-            
-            if response_recent.status_code != SUCCESSFUL_REQUEST:
+            historical_data = pd.DataFrame({'close': prices['close']}, index=pd.DatetimeIndex(prices['date'], name='date'))
+
+            # Fetch recent data for today's value; the price store only requests the days it doesn't have yet
+            try:
+                recent_prices = get_prices(ticker_symbol, '1day', ten_days_before_today, today_date)
+            except FMPError:
                 st.error("Could not fetch recent stock data.")
                 st.stop()
                 
-            recent_data = response_recent.json()
-            if 'historical' not in recent_data or not recent_data['historical']:
+            if len(recent_prices) == 0:
                 st.error("No recent stock data available.")
                 st.stop()
-                
-            recent_historical_data = pd.DataFrame(recent_data['historical'])
 
             # Extract closing prices
-            closing_prices = historical_data['close'].values.flatten().tolist()
-            past_ten_days_closing_prices = recent_historical_data['close'].values.flatten().tolist()
+            closing_prices = historical_data['close'].to_numpy(dtype=float)
+
+            # Buy whole dollar amounts on each scheduled market day and accumulate the shares
+            buy_indices = purchase_schedule(historical_data.index.values, frequency)
+            dca = simulate_dca(closing_prices, buy_indices, investment_amount)
 
             # Calculate financial metrics
-            average_price = sum(closing_prices) / len(closing_prices)
+            average_price = closing_prices.mean()
             latest_closing_price = closing_prices[-1]
-            todays_closing_price = past_ten_days_closing_prices[0]  # Most recent price
-
-            num_investment_days = len(closing_prices)
-            invested_amount = daily_investment_amount * num_investment_days
-            rate_of_return = ((latest_closing_price / average_price) - 1) * 100
-            profit = invested_amount * (rate_of_return / 100)
-            portfolio_value = invested_amount + profit
-            num_of_stocks = portfolio_value / latest_closing_price
+            todays_closing_price = recent_prices['close'][-1]  # Most recent price
+            todays_closing_date = recent_prices['date'][-1].astype('datetime64[D]')
+
+            invested_amount = dca.invested[-1]
+            portfolio_value = dca.value[-1]
+            profit = portfolio_value - invested_amount
+            rate_of_return = ((portfolio_value / invested_amount) - 1) * 100
+            num_of_stocks = dca.shares[-1]
             todays_portfolio_value = num_of_stocks * todays_closing_price
 
             final_today_rate_of_return = ((todays_portfolio_value / invested_amount) - 1)
             final_today_rate_of_return_percent = final_today_rate_of_return * 100
             final_profit = round(invested_amount * final_today_rate_of_return, 2)
 
-            annual_irr_percent = calculate_annualized_irr(daily_investment_amount, closing_prices, todays_portfolio_value)
+            annual_irr_percent = calculate_annualized_irr(historical_data.index.values.astype('datetime64[D]'),
+                                                          dca.contributions, todays_portfolio_value,
+                                                          todays_closing_date)
 
             # Display results in a green box with black text
             st.markdown(
@@ -164,6 +213,15 @@ def main():
                 unsafe_allow_html=True
             )
 
+            with metrics.span("chart_build", chart="dca"):
+                st.line_chart(pd.DataFrame(
+                    {"Portfolio value": dca.value, "Amount invested": dca.invested},
+                    index=historical_data.index
+                ))
+
+            if show_rolling_windows:
+                display_rolling_windows(ticker_symbol, frequency, investment_amount, int(window_years), end_date)
+
     st.markdown("---")
     st.markdown("""
     **Disclaimer:** This portfolio value estimator provides general estimates based on historical data and assumptions. 
@@ -1,6 +1,12 @@
 import streamlit as st
+import pandas as pd
+import numpy as np
+import plotly.graph_objects as go
 from datetime import date, timedelta
 import yfinance as yf
+
+from utils import metrics
+from utils.retirement_projections import retirement_target_grid, simulate_retirement
     
     
 class RetirementCalculator:
@@ -10,14 +16,46 @@ class RetirementCalculator:
     PERCENTAGE_MULTIPLIER = 100
     AVERAGE_ANNUAL_INFLATION_RATE = 0.037
     
+    DEFAULT_LIFE_EXPECTANCY = 95.0
+    DEFAULT_EXPECTED_ANNUAL_RETURN = 0.07
+    DEFAULT_ANNUAL_RETURN_VOLATILITY = 0.15
+    DEFAULT_INFLATION_VOLATILITY = 0.02
+    NUM_OF_SIMULATION_PATHS = 50_000
+    
+    SENSITIVITY_EXPENSE_LEVELS = 21
+    SENSITIVITY_AGE_SPAN = 10  # years either side of the planned retirement age
+    MAX_RETIREMENT_AGE = 100
+    SENSITIVITY_INFLATION_RANGE = (1.0, 6.0)  # %
+    SENSITIVITY_INFLATION_STEP = 0.25  # %
+    WITHDRAWAL_MULTIPLES = (20, 25, 30, 33, 40, 50)
+    
     class User:
         def __init__(self):
             self.annual_expenses = None
             self.current_age = None
             self.retirement_age = None
+            self.life_expectancy = None
+    
+    class SimulationSettings:
+        def __init__(self):
+            self.enabled = False
+            self.expected_annual_return = None
+            self.annual_return_volatility = None
+            self.inflation_volatility = None
+            self.seed = None
+    
+    class SensitivitySettings:
+        def __init__(self):
+            self.enabled = False
+            self.expenses = None
+            self.retirement_ages = None
+            self.inflation_rates = None
+            self.multiples = None
         
     def __init__(self):
         self.user = self.User()
+        self.simulation = self.SimulationSettings()
+        self.sensitivity = self.SensitivitySettings()
         self.initialize_app()
     
     def initialize_app(self):
@@ -44,6 +82,79 @@ class RetirementCalculator:
             value=65.0
             )
     
+    def retrieve_simulation_settings(self):
+        self.simulation.enabled = st.checkbox(
+            "Run a Monte Carlo simulation of investment returns and inflation during retirement",
+            help=f"Simulates {self.NUM_OF_SIMULATION_PATHS:,} market and inflation paths to estimate how likely the savings target is to last."
+            )
+        if not self.simulation.enabled:
+            return
+        self.user.life_expectancy = st.number_input(
+            "**Plan for savings to last until age:**",
+            min_value=self.user.retirement_age + 1,
+            step=1.0,
+            value=max(self.DEFAULT_LIFE_EXPECTANCY, self.user.retirement_age + 1)
+            )
+        self.simulation.expected_annual_return = st.number_input(
+            "**Expected average annual return on savings during retirement (%):**",
+            step=0.5,
+            value=self.DEFAULT_EXPECTED_ANNUAL_RETURN * self.PERCENTAGE_MULTIPLIER
+            ) / self.PERCENTAGE_MULTIPLIER
+        self.simulation.annual_return_volatility = st.number_input(
+            "**Annual return volatility (standard deviation, %):**",
+            min_value=0.0,
+            step=1.0,
+            value=self.DEFAULT_ANNUAL_RETURN_VOLATILITY * self.PERCENTAGE_MULTIPLIER
+            ) / self.PERCENTAGE_MULTIPLIER
+        self.simulation.inflation_volatility = st.number_input(
+            "**Annual inflation volatility (standard deviation, %):**",
+            min_value=0.0,
+            step=0.5,
+            value=self.DEFAULT_INFLATION_VOLATILITY * self.PERCENTAGE_MULTIPLIER
+            ) / self.PERCENTAGE_MULTIPLIER
+        self.simulation.seed = st.number_input("**Random seed** (same seed, same result):", min_value=0, step=1, value=0)
+    
+    def retrieve_sensitivity_settings(self):
+        self.sensitivity.enabled = st.checkbox(
+            "Show a what-if grid of savings targets across retirement ages, expenses, inflation rates and withdrawal multiples"
+            )
+        if not self.sensitivity.enabled:
+            return
+        earliest_age = int(np.ceil(self.user.current_age))
+        latest_age = max(self.MAX_RETIREMENT_AGE, earliest_age + 1)
+        planned_age = min(max(int(round(self.user.retirement_age)), earliest_age), latest_age)
+        youngest, oldest = st.slider(
+            "**Retirement ages:**",
+            min_value=earliest_age,
+            max_value=latest_age,
+            value=(max(planned_age - self.SENSITIVITY_AGE_SPAN, earliest_age),
+                   min(planned_age + self.SENSITIVITY_AGE_SPAN, latest_age))
+            )
+        self.sensitivity.retirement_ages = tuple(range(youngest, oldest + 1))
+        expenses = max(self.user.annual_expenses, 1000.0)
+        lowest, highest = st.slider(
+            "**Annual expenses:** $",
+            min_value=0.0,
+            max_value=float(round(expenses * 4, -3)),
+            step=1000.0,
+            value=(float(round(expenses * 0.5, -3)), float(round(expenses * 1.5, -3)))
+            )
+        self.sensitivity.expenses = tuple(np.linspace(lowest, highest, self.SENSITIVITY_EXPENSE_LEVELS).tolist())
+        lowest, highest = st.slider(
+            "**Annual inflation rates (%):**",
+            min_value=0.0,
+            max_value=10.0,
+            step=self.SENSITIVITY_INFLATION_STEP,
+            value=self.SENSITIVITY_INFLATION_RANGE
+            )
+        steps = int(round((highest - lowest) / self.SENSITIVITY_INFLATION_STEP)) + 1
+        self.sensitivity.inflation_rates = tuple((np.linspace(lowest, highest, steps) / self.PERCENTAGE_MULTIPLIER).tolist())
+        self.sensitivity.multiples = tuple(sorted(st.multiselect(
+            "**Withdrawal multiples** (savings target as a multiple of annual expenses):",
+            self.WITHDRAWAL_MULTIPLES,
+            default=self.WITHDRAWAL_MULTIPLES
+            ))) or (self.FAT_FIRE_MULTIPLE,)
+    
     def calculate(self):
         self.user.years_until_retirement = self.user.retirement_age - self.user.current_age
         self.user.retirement_amount_raw = self.user.annual_expenses * self.FAT_FIRE_MULTIPLE
@@ -51,6 +162,94 @@ class RetirementCalculator:
                                                           ((1 + self.AVERAGE_ANNUAL_INFLATION_RATE) ** 
                                                            self.user.years_until_retirement))
     
+    def calculate_simulation(self):
+        with metrics.span("monte_carlo", paths=self.NUM_OF_SIMULATION_PATHS):
+            self.simulation.result = run_simulation(
+                self.user.years_until_retirement,
+                self.user.life_expectancy - self.user.retirement_age,
+                self.user.inflation_adjusted_retirement_amount,
+                self.user.annual_expenses,
+                self.simulation.expected_annual_return,
+                self.simulation.annual_return_volatility,
+                self.AVERAGE_ANNUAL_INFLATION_RATE,
+                self.simulation.inflation_volatility,
+                self.NUM_OF_SIMULATION_PATHS,
+                int(self.simulation.seed)
+            )
+    
+    def display_simulation_results(self):
+        result = self.simulation.result
+        st.subheader("Monte Carlo Simulation")
+        st.markdown(
+            f"""
+            <div style="background-color: #d4edda; padding: 10px; border-radius: 5px; color: black;">
+                <p>In <strong>{result.success_probability * self.PERCENTAGE_MULTIPLIER:,.1f}%</strong> of {self.NUM_OF_SIMULATION_PATHS:,} simulated scenarios, savings of ${self.user.inflation_adjusted_retirement_amount:,.2f} at retirement last until age {self.user.life_expectancy:,.0f} while withdrawing your annual expenses, adjusted for inflation, every year.</p>
+                <p>In the median scenario, <strong>${result.balance_bands[result.percentiles.index(50)][-1]:,.2f}</strong> (in today's dollars) would be left at age {self.user.life_expectancy:,.0f}.</p>
+            </div>
+            """,
+            unsafe_allow_html=True
+        )
+        ages = self.user.retirement_age + pd.RangeIndex(result.balance_bands.shape[1])
+        st.line_chart(pd.DataFrame(
+            {f"{percentile}th percentile": band for percentile, band in zip(result.percentiles, result.balance_bands)},
+            index=pd.Index(ages, name="Age")
+        ))
+        st.caption("Savings during retirement in today's dollars, by percentile of the simulated scenarios.")
+    
+    def display_sensitivity_grid(self):
+        sensitivity = self.sensitivity
+        years_until_retirement = tuple(age - self.user.current_age for age in sensitivity.retirement_ages)
+        with metrics.span("sensitivity_grid"):
+            grid = compute_sensitivity_grid(sensitivity.expenses, years_until_retirement,
+                                            sensitivity.inflation_rates, sensitivity.multiples)
+        st.subheader("What-if Grid")
+        st.caption(f"{grid.size:,} scenarios, as savings needed at the time of retirement.")
+
+        inflation_labels = [f"{rate * self.PERCENTAGE_MULTIPLIER:.2f}%" for rate in sensitivity.inflation_rates]
+        multiple_labels = [f"{multiple}x ({self.PERCENTAGE_MULTIPLIER / multiple:.1f}% withdrawal)" for multiple in sensitivity.multiples]
+        default_inflation = int(np.abs(np.array(sensitivity.inflation_rates) - self.AVERAGE_ANNUAL_INFLATION_RATE).argmin())
+        default_multiple = int(np.abs(np.array(sensitivity.multiples) - self.FAT_FIRE_MULTIPLE).argmin())
+        inflation_index = inflation_labels.index(st.selectbox("Inflation rate", inflation_labels, index=default_inflation))
+        multiple_index = multiple_labels.index(st.selectbox("Withdrawal multiple", multiple_labels, index=default_multiple))
+
+        with metrics.span("chart_build", chart="sensitivity_ages_expenses"):
+            fig = self.heatmap(
+                grid[:, :, inflation_index, multiple_index],
+                x=list(sensitivity.retirement_ages),
+                y=[f"${expenses:,.0f}" for expenses in sensitivity.expenses],
+                x_title="Retirement age",
+                y_title="Annual expenses",
+                title=f"Savings target at {inflation_labels[inflation_index]} inflation and a {sensitivity.multiples[multiple_index]}x multiple"
+            )
+        st.plotly_chart(fig, use_container_width=True)
+
+        # The grid rows and columns closest to the answers above
+        expense_index = int(np.abs(np.array(sensitivity.expenses) - self.user.annual_expenses).argmin())
+        age_index = int(np.abs(np.array(sensitivity.retirement_ages) - self.user.retirement_age).argmin())
+        with metrics.span("chart_build", chart="sensitivity_inflation_multiples"):
+            fig = self.heatmap(
+                grid[expense_index, age_index].T,
+                x=inflation_labels,
+                y=multiple_labels,
+                x_title="Annual inflation",
+                y_title="Withdrawal multiple",
+                title=f"Savings target for ${sensitivity.expenses[expense_index]:,.0f} a year, retiring at {sensitivity.retirement_ages[age_index]}"
+            )
+        st.plotly_chart(fig, use_container_width=True)
+    
+    @staticmethod
+    def heatmap(values, x, y, x_title, y_title, title):
+        fig = go.Figure(go.Heatmap(
+            z=values,
+            x=x,
+            y=y,
+            colorscale="Viridis",
+            colorbar=dict(title="Target ($)"),
+            hovertemplate=f"{x_title}: %{{x}}<br>{y_title}: %{{y}}<br>Target: $%{{z:,.0f}}<extra></extra>"
+        ))
+        fig.update_layout(title=title, xaxis_title=x_title, yaxis_title=y_title)
+        return fig
+    
     def display_results(self):
         st.subheader("Results")
         st.markdown(
@@ -63,12 +262,35 @@ class RetirementCalculator:
             unsafe_allow_html=True
         )
 
+@st.cache_data(max_entries=32)
+def compute_sensitivity_grid(expenses, years_until_retirement, inflation_rates, multiples):
+    return retirement_target_grid(expenses, years_until_retirement, inflation_rates, multiples)
+
+
+@st.cache_data(max_entries=32)
+def run_simulation(years_until_retirement, years_in_retirement, starting_balance, annual_expenses, return_mean,
+                   return_volatility, inflation_mean, inflation_volatility, num_of_paths, seed):
+    return simulate_retirement(years_until_retirement, years_in_retirement, starting_balance, annual_expenses,
+                               return_mean, return_volatility, inflation_mean, inflation_volatility,
+                               num_of_paths=num_of_paths, seed=seed)
+
+
+@metrics.traced_page
 def main():
     retirement_calculator = RetirementCalculator()
     retirement_calculator.retrieve_user_info()
+    retirement_calculator.retrieve_simulation_settings()
+    retirement_calculator.retrieve_sensitivity_settings()
     retirement_calculator.calculate()
     if st.button("Calculate"):
         retirement_calculator.display_results()
+        if retirement_calculator.simulation.enabled:
+            with st.spinner("Simulating..."):
+                retirement_calculator.calculate_simulation()
+            retirement_calculator.display_simulation_results()
+    # Recomputing the whole grid takes milliseconds, so it follows the inputs without the Calculate button
+    if retirement_calculator.sensitivity.enabled:
+        retirement_calculator.display_sensitivity_grid()
         
     st.markdown("---")
     st.markdown("""
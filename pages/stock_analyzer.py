@@ -1,93 +1,92 @@
-import requests
-from utils.shared_functions import is_market_open, get_previous_market_day
+import logging
+
+from utils import metrics, sentiment_store
+from utils.downsampling import DEFAULT_MAX_CANDLES, resample_ohlc
+from utils.fetch_engine import FetchPlan, run_with_deadlines
+from utils.fmp_batch import get_profile
+from utils.fmp_client import FMPError, fmp_get_first, fmp_get_list
+from utils.price_store import get_prices
+from utils.ratings import average_analyst_rating, average_recommendation_rating
+from utils.sentiment import analyze_sentiments, get_model_state, warm_up, READY
+from utils.shared_functions import get_previous_market_day, get_setting, is_setting_enabled
 from datetime import datetime, timedelta
-from transformers import BertTokenizer, BertForSequenceClassification
-import torch
+from functools import partial
+import time
 from statistics import mean
 import streamlit as st
 import plotly.graph_objects as go
-import matplotlib.pyplot as plt
-
-STRONG_BUY_SCORE = 5
-BUY_SCORE = 4
-HOLD_SCORE = 3
-SELL_SCORE = 2
-STRONG_SELL_SCORE = 1
+from matplotlib.figure import Figure
 
 MAX_FREE_TIER_MAXIMIZE_FETCH = 100
 MILLION = 1_000_000
 BILLION = 1_000_000_000
 TRILLION = 1_000_000_000_000
 THOUSAND = 1_000
-SUCCESSFUL_REQUEST = 200
 
-# Load FinBERT model and tokenizer (cached to avoid reloading)
-@st.cache_resource
-def load_finbert_model():
-    model_name = "yiyanghkust/finbert-tone"
-    tokenizer = BertTokenizer.from_pretrained(model_name)
-    model = BertForSequenceClassification.from_pretrained(model_name)
-    return tokenizer, model
+# Seconds each section may take before the page gives up on it; override with e.g. the sentiment_timeout setting
+SECTION_TIMEOUTS = {
+    "chart": 30,
+    "financials": 30,
+    "recommendation": 30,
+    "sentiment": 180,  # includes loading FinBERT on a cold start
+}
 
-tokenizer, model = load_finbert_model()
+NEWS_ARTICLE_LIMIT = 50
+NEWS_REFRESH_INTERVAL = 15 * 60  # seconds
 
-def get_stock_news(stock_symbol):
-    fmp_api_key = st.secrets["fmp_api_key"]
-    url = f'https://financialmodelingprep.com/api/v3/stock_news?tickers={stock_symbol}&apikey={fmp_api_key}'
-    
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        st.error(f"Error fetching news: {e}")
-        return None
+logger = logging.getLogger(__name__)
 
 
-def analyze_sentiment(text):
-    inputs = tokenizer(text, return_tensors="pt", truncation=True, max_length=512, padding=True)
-    with torch.no_grad():
-        outputs = model(**inputs)
-        logits = outputs.logits
-    probs = torch.softmax(logits, dim=1).tolist()[0]
-    sentiment_idx = probs.index(max(probs))
-    if sentiment_idx == 0:  # negative
-        compound = -probs[0]
-    elif sentiment_idx == 2:  # positive
-        compound = probs[2]
-    else:  # neutral
-        compound = 0.0
-    return compound
+class SectionError(Exception):
+    # A failure with a message meant for the user, shown in place of the section
+    pass
 
 
-def analyze_stock_sentiment(stock_symbol):
-    st.write(f"Analyzing sentiment for {stock_symbol}...")
-    
-    articles = get_stock_news(stock_symbol)
-    if not articles:
-        return "No articles found or error occurred"
-    
-    sentiments = []
-    article_details = []
-    
+def get_stock_news(stock_symbol, since=None):
+    params = {"tickers": stock_symbol, "limit": NEWS_ARTICLE_LIMIT}
+    if since:
+        params["from"] = since[:10]  # the endpoint filters by day, so the boundary day is refetched
+    # The sentiment store already remembers every article, so skip the response cache
+    return fmp_get_list("api/v3/stock_news", params, use_cache=False)
+
+
+def ingest_stock_news(stock_symbol, watermark):
+    # Fetches articles published since the watermark and scores only those not already stored.
+    # Returns an error message when the news could not be fetched.
+    try:
+        articles = get_stock_news(stock_symbol, since=watermark)
+    except FMPError as e:
+        logger.warning("Error fetching news for %s: %s", stock_symbol, e)
+        return f"Error fetching news: {e}"
+
+    candidates = {}
     for article in articles:
-        title = article.get('title', '')
-        text = article.get('text', '')
-        url = article.get('url', '')
-        
-        content = f"{title} {text}"
+        content = f"{article.get('title', '')} {article.get('text', '')}"
         if content.strip():
-            sentiment_score = analyze_sentiment(content)
-            sentiments.append(sentiment_score)
-            article_details.append({
-                'title': title,
-                'sentiment': sentiment_score,
-                'url': url
-            })
-            st.write(f"Article: {title[:50]}... Sentiment: {sentiment_score:.3f}")
-    
-    if not sentiments:
-        return "No valid content found for sentiment analysis"
+            candidates.setdefault(sentiment_store.article_id(article, content), (article, content))
+
+    known_ids = sentiment_store.known_article_ids(stock_symbol, list(candidates))
+    new_articles = [(article_id, article, content) for article_id, (article, content) in candidates.items()
+                    if article_id not in known_ids]
+    sentiments = analyze_sentiments([content for _, _, content in new_articles])
+
+    sentiment_store.add_articles(stock_symbol, (
+        (article_id, article.get('publishedDate', ''), article.get('title', ''), article.get('url', ''), sentiment)
+        for (article_id, article, _), sentiment in zip(new_articles, sentiments)
+    ))
+
+
+def analyze_stock_sentiment(stock_symbol):
+    news_error = None
+    watermark, checked_at = sentiment_store.get_watermark(stock_symbol)
+    if checked_at is None or time.time() - checked_at >= NEWS_REFRESH_INTERVAL:
+        news_error = ingest_stock_news(stock_symbol, watermark)
+
+    article_details = sentiment_store.latest_articles(stock_symbol, NEWS_ARTICLE_LIMIT)
+    if not article_details:
+        raise SectionError(news_error or "No articles found or error occurred")
+
+    sentiments = [detail['sentiment'] for detail in article_details]
     
     avg_sentiment = mean(sentiments)
     interpretation = ""
@@ -99,6 +98,8 @@ def analyze_stock_sentiment(stock_symbol):
         interpretation = "Neutral"
     
     output = f"""
+{f"*{news_error}; showing the articles analyzed earlier.*" if news_error else ""}
+
 **Stock:** {stock_symbol}  
 **Average Sentiment Score:** {avg_sentiment:.3f}  
 **Overall Sentiment:** {interpretation}  
@@ -116,10 +117,7 @@ def analyze_stock_sentiment(stock_symbol):
 
 def plot_stock_price(symbol, timeframe):
     # Define timeframe parameters
-    end_date = datetime.now()
-    
-    if not is_market_open(end_date):
-        end_date = get_previous_market_day(end_date)
+    end_date = get_previous_market_day(datetime.now())
         
     if timeframe == '1d':
         start_date = end_date - timedelta(days=1)
@@ -152,75 +150,82 @@ def plot_stock_price(symbol, timeframe):
         start_date = None
         interval = '1day'
 
-    # Fetch stock data using FMP API
-    fmp_api_key = st.secrets["fmp_api_key"]
-    if start_date:
-        url = f"https://financialmodelingprep.com/api/v3/historical-chart/{interval}/{symbol}?from={start_date.strftime('%Y-%m-%d')}&to={end_date.strftime('%Y-%m-%d')}&apikey={fmp_api_key}"
-    else:
-        url = f"https://financialmodelingprep.com/api/v3/historical-chart/{interval}/{symbol}?apikey={fmp_api_key}"
-    
-    response = requests.get(url)
-    if response.status_code != SUCCESSFUL_REQUEST:
-        st.error(f"No data available for {symbol}")
-        return
-
-    data = response.json()
-    if not data:
-        st.error(f"No data available for {symbol}")
-        return
-
-    # Create the candlestick chart
-    fig = go.Figure(data=[go.Candlestick(
-        x=[entry['date'] for entry in data],
-        open=[entry['open'] for entry in data],
-        high=[entry['high'] for entry in data],
-        low=[entry['low'] for entry in data],
-        close=[entry['close'] for entry in data]
-    )])
-
-    # Update layout
-    fig.update_layout(
-        title=f'{symbol} Stock Price ({timeframe})',
-        yaxis_title='Price',
-        xaxis_title='Date',
-        template='plotly_dark'
-    )
+    # Fetch stock data from the local price store, which only asks FMP for missing dates
+    try:
+        prices = get_prices(symbol, interval, start_date, end_date if start_date else None)
+    except FMPError:
+        raise SectionError(f"No data available for {symbol}")
+
+    if len(prices) == 0:
+        raise SectionError(f"No data available for {symbol}")
+
+    with metrics.span("chart_build", chart="stock_price"):
+        # Merge bars so long histories don't send tens of thousands of candles to the browser
+        prices = resample_ohlc(prices, int(get_setting("chart_max_candles", DEFAULT_MAX_CANDLES)))
+
+        # Create the candlestick chart
+        fig = go.Figure(data=[go.Candlestick(
+            x=prices['date'],
+            open=prices['open'],
+            high=prices['high'],
+            low=prices['low'],
+            close=prices['close']
+        )])
+
+        # Update layout
+        fig.update_layout(
+            title=f'{symbol} Stock Price ({timeframe})',
+            yaxis_title='Price',
+            xaxis_title='Date',
+            template='plotly_dark'
+        )
 
     return fig
 
 
-def get_intrinsic_value(symbol):
-    fmp_api_key = st.secrets["fmp_api_key"]
+# Every independent FMP record the page needs for a symbol
+ANALYZER_REQUESTS = {
+    "profile": get_profile,
+    "income_statement": lambda symbol: fmp_get_first(f"api/v3/income-statement/{symbol}", {"limit": 1}),
+    "key_metrics": lambda symbol: fmp_get_first(f"api/v3/key-metrics/{symbol}", {"period": "annual"}),
+    "dcf": lambda symbol: fmp_get_first(f"api/v3/discounted-cash-flow/{symbol}"),
+    "rating": lambda symbol: fmp_get_first(f"api/v3/rating/{symbol}"),
+    "analyst_ratings": lambda symbol: fmp_get_first(f"api/v3/analyst-stock-recommendations/{symbol}"),
+}
+
+
+def create_fetch_plan(symbol):
+    # Issues all of the page's requests for symbol at once; lives for a single render
+    return FetchPlan({name: partial(fetch, symbol) for name, fetch in ANALYZER_REQUESTS.items()})
+
+
+def fetch_record(symbol, name, plan=None):
+    if plan is not None and name in plan:
+        return plan.get(name)
+    return ANALYZER_REQUESTS[name](symbol)
+
+
+def get_intrinsic_value(symbol, plan=None):
     # using DCF method for calculating intrinsic value
-    url = (f"https://financialmodelingprep.com/api/v3/discounted-cash-flow/{symbol}?apikey={fmp_api_key}")
-    response = requests.get(url)
-    if response.status_code == SUCCESSFUL_REQUEST:
-        data = response.json()  # Parse the JSON response
-        return data[0]["dcf"], data[0]['Stock Price']
+    try:
+        data = fetch_record(symbol, "dcf", plan)
+    except FMPError:
+        return None
+    return data["dcf"], data['Stock Price']
 
 
-def get_company_financials(symbol):
-    fmp_api_key = st.secrets["fmp_api_key"]
-    
-    # Get company profile
-    profile_url = f"https://financialmodelingprep.com/api/v3/profile/{symbol}?apikey={fmp_api_key}"
-    profile_response = requests.get(profile_url)
-    
-    # Get income statement
-    income_url = f"https://financialmodelingprep.com/api/v3/income-statement/{symbol}?limit=1&apikey={fmp_api_key}"
-    income_response = requests.get(income_url)
+def get_company_financials(symbol, plan=None):
+    try:
+        # Get company profile
+        profile_data = fetch_record(symbol, "profile", plan)
 
-    # Get key metrics
-    metrics_url = f"https://financialmodelingprep.com/api/v3/key-metrics/{symbol}?period=annual&apikey={fmp_api_key}"
-    metrics_response = requests.get(metrics_url)
-    
-    if profile_response.status_code != SUCCESSFUL_REQUEST or income_response.status_code != SUCCESSFUL_REQUEST or metrics_response.status_code != SUCCESSFUL_REQUEST:
-        st.error("Failed to fetch company data")
-        return
-    
-    profile_data = profile_response.json()[0]
-    income_data = income_response.json()[0]
-    metrics_data = metrics_response.json()[0]
+        # Get income statement
+        income_data = fetch_record(symbol, "income_statement", plan)
+
+        # Get key metrics
+        metrics_data = fetch_record(symbol, "key_metrics", plan)
+    except FMPError:
+        raise SectionError("Failed to fetch company data")
     
     # Extract relevant financial data
     revenue = income_data.get('revenue', 'N/A')
@@ -234,7 +239,10 @@ def get_company_financials(symbol):
     net_profit = format_value(net_profit)
     market_cap = format_value(market_cap)
     
-    intrinsic_value, current_price = get_intrinsic_value(symbol)
+    intrinsic_value_and_price = get_intrinsic_value(symbol, plan)
+    if intrinsic_value_and_price is None:
+        raise SectionError("Failed to fetch company data")
+    intrinsic_value, current_price = intrinsic_value_and_price
     
     valuation = ""
     
@@ -296,48 +304,30 @@ def format_value(value):
         return f'{value:.2f}'
 
 
-def get_average_analyst_rating(stock_symbol):
-    api_key = st.secrets["fmp_api_key"]
-    url = f"https://financialmodelingprep.com/api/v3/analyst-stock-recommendations/{stock_symbol}?apikey={api_key}"
-    response = requests.get(url)
-    response = response.json()
-    analysts_ratings = response[0]
-    total_score = 0
-    total_score = total_score + STRONG_BUY_SCORE * analysts_ratings['analystRatingsStrongBuy']
-    total_score = total_score + BUY_SCORE * analysts_ratings['analystRatingsbuy']
-    total_score = total_score + HOLD_SCORE * analysts_ratings['analystRatingsHold']
-    total_score = total_score + SELL_SCORE * analysts_ratings['analystRatingsSell']
-    total_score = total_score + STRONG_SELL_SCORE * analysts_ratings['analystRatingsStrongSell']
-    total_analysts = analysts_ratings['analystRatingsStrongBuy'] + analysts_ratings['analystRatingsbuy'] + analysts_ratings['analystRatingsHold'] + analysts_ratings['analystRatingsSell'] + analysts_ratings['analystRatingsStrongSell']
-    average_analyst_rating = total_score / total_analysts
-    return average_analyst_rating
-
-
-def get_average_recommendation_rating(stock_symbol):
-    fmp_api_key = st.secrets["fmp_api_key"]
-    url = f"https://financialmodelingprep.com/api/v3/rating/{stock_symbol}?apikey={fmp_api_key}"
-    response = requests.get(url)
-    if response.status_code == SUCCESSFUL_REQUEST:
-        data = response.json()  # Parse the JSON response
-        all_rating_scores = list()
-        all_rating_scores.append(data[0]["ratingScore"])
-        all_rating_scores.append(data[0]["ratingDetailsDCFScore"])  # Discounted Cash Flow
-        all_rating_scores.append(data[0]["ratingDetailsROEScore"])  # Return on Equity
-        all_rating_scores.append(data[0]["ratingDetailsROAScore"])  # Return on Assets 
-        all_rating_scores.append(data[0]["ratingDetailsDEScore"])  # Debt to Equity 
-        all_rating_scores.append(data[0]["ratingDetailsPEScore"])  # Price to Earnings
-        all_rating_scores.append(data[0]["ratingDetailsPBScore"])  # Price to Book
-        all_rating_scores.append(get_average_analyst_rating(stock_symbol))
-        
-        return round(mean(all_rating_scores), 2)
-    else:
-        print(f"Error unable to receive response")
+def get_average_analyst_rating(stock_symbol, plan=None):
+    return average_analyst_rating(fetch_record(stock_symbol, "analyst_ratings", plan))
 
 
-def display_recommendation(stock_symbol):
-    st.title("Recommendation")
-    
-    fig, ax = plt.subplots(figsize=(10, 2))
+def get_average_recommendation_rating(stock_symbol, plan=None):
+    try:
+        data = fetch_record(stock_symbol, "rating", plan)
+        analysts_ratings = fetch_record(stock_symbol, "analyst_ratings", plan)
+    except FMPError as e:
+        logger.warning("Error fetching the ratings for %s: %s", stock_symbol, e)
+        return None
+
+    return average_recommendation_rating(data, analysts_ratings)
+
+
+def recommendation_figure(stock_symbol, plan=None):
+    average_recommendation_rating: float = get_average_recommendation_rating(stock_symbol, plan)
+    if average_recommendation_rating is None:
+        raise SectionError("Failed to fetch the analyst ratings")
+    average_recommendation_rating_str = str(average_recommendation_rating)
+
+    # Figure instead of pyplot, which keeps global state and isn't safe to use from worker threads
+    fig = Figure(figsize=(10, 2))
+    ax = fig.subplots()
     # Create the number line (1 to 5)
     ax.plot([1, 5], [0, 0], 'k-', lw=2)  # Main line
     ax.plot([1, 1], [-0.1, 0.1], 'k-')  # Left end
@@ -356,9 +346,6 @@ def display_recommendation(stock_symbol):
         ax.plot([rating, rating], [-0.05, 0.05], 'k-')  # Tick marks
         ax.text(rating, -0.15, label, ha='center', va='top')
 
-    average_recommendation_rating: float = get_average_recommendation_rating(stock_symbol)
-    average_recommendation_rating_str = str(average_recommendation_rating)
-    
     ax.plot(average_recommendation_rating, 0, 'ro', markersize=10)  # Red dot for 2.7
     ax.text(average_recommendation_rating, 0.1, average_recommendation_rating_str, ha='center', va='bottom')
 
@@ -367,38 +354,81 @@ def display_recommendation(stock_symbol):
     ax.set_ylim(-0.3, 0.3)
     ax.axis('off')  # Hide axes
 
-    st.pyplot(fig)
+    return fig, average_recommendation_rating
+
+
+def render_price_chart(fig):
+    st.plotly_chart(fig, use_container_width=True)
+
 
+def render_recommendation(figure_and_rating):
+    fig, average_recommendation_rating = figure_and_rating
+    st.pyplot(fig)
     st.write(f"The red dot represents the current rating value of {average_recommendation_rating} on the scale from Strong Sell (1) to Strong Buy (5).")
 
 
+def render_sections(sections):
+    # sections: (name, header, loading text, compute, render) in page order. Every compute starts at
+    # once in a worker; each section is drawn in its placeholder as soon as its result is in, and
+    # sections that outlive their timeout show a warning instead of holding up the page.
+    placeholders = {}
+    for name, header, loading_text, _, _ in sections:
+        if header:
+            st.header(header)
+        placeholders[name] = st.empty()
+        placeholders[name].info(loading_text)
+
+    renderers = {name: render for name, _, _, _, render in sections}
+    tasks = {name: compute for name, _, _, compute, _ in sections}
+    timeouts = {name: float(get_setting(f"{name}_timeout", SECTION_TIMEOUTS[name])) for name in tasks}
+    for name, result, error in run_with_deadlines(tasks, timeouts):
+        with placeholders[name].container():
+            if error is not None:
+                metrics.increment("section_errors", section=name, error=type(error).__name__)
+            if isinstance(error, TimeoutError):
+                st.warning(f"This section took longer than {timeouts[name]:g} seconds and was skipped. Try again shortly.")
+            elif isinstance(error, SectionError):
+                st.error(str(error))
+            elif error is not None:
+                logger.error("Error rendering the %s section", name, exc_info=error)
+                st.error("Something went wrong while loading this section.")
+            else:
+                with metrics.span("section_render", section=name):
+                    renderers[name](result)
+
+
+@metrics.traced_page
 def main():
     st.title("Stock Analyzer")
+    if is_setting_enabled("sentiment_warm_up"):
+        warm_up()  # load FinBERT while the user is still typing a symbol
     st.write("Enter a stock symbol to analyze sentiment based on recent financial news articles.")
     
     stock_symbol = st.text_input("Stock Symbol (e.g., AAPL for Apple)", "").upper()
     
     if stock_symbol:
+        # One fetch plan shares the financials and rating requests between the sections
+        plan = create_fetch_plan(stock_symbol)
+
         # Add timeframe selector
         timeframes = ['1d', '1w', '1m', '3m', '6m', 'ytd', '1y', '3y', '5y', 'max']
         selected_timeframe = st.selectbox('Select Timeframe', timeframes, index=timeframes.index('1y'))
-        
-        # Plot stock price
-        fig = plot_stock_price(stock_symbol, selected_timeframe)
-        if fig:
-            st.plotly_chart(fig, use_container_width=True)
-        
-        # Display company financials
-        st.header("Financials")
-        financials = get_company_financials(stock_symbol)
-        st.markdown(financials)
-        
-        display_recommendation(stock_symbol)
-        
-        st.header("Sentiment Analysis") 
-        with st.spinner("Fetching and analyzing news..."):
-            result = analyze_stock_sentiment(stock_symbol)
-            st.markdown(result)
+
+        sentiment_loading_text = "Fetching and analyzing news..."
+        if get_model_state() != READY:
+            sentiment_loading_text = "Loading the sentiment model and analyzing news..."
+
+        # The sections are independent, so they load concurrently and the fastest shows up first
+        render_sections([
+            ("chart", None, "Loading the price chart...",
+             partial(plot_stock_price, stock_symbol, selected_timeframe), render_price_chart),
+            ("financials", "Financials", "Loading company financials...",
+             partial(get_company_financials, stock_symbol, plan), st.markdown),
+            ("recommendation", "Recommendation", "Loading analyst ratings...",
+             partial(recommendation_figure, stock_symbol, plan), render_recommendation),
+            ("sentiment", "Sentiment Analysis", sentiment_loading_text,
+             partial(analyze_stock_sentiment, stock_symbol), st.markdown),
+        ])
     else:
         st.warning("Please enter a stock symbol.")
 
@@ -1,5 +1,5 @@
-import requests
 import json
+import time
 import certifi
 import tqdm
 import streamlit as st 
@@ -9,13 +9,19 @@ from urllib.request import urlopen
 import plotly.graph_objects as go
 
 import pages.stock_analyzer
-from pages.stock_analyzer import get_average_recommendation_rating
 from pages.stock_analyzer import format_value
+from utils import metrics
+from utils.downsampling import DEFAULT_MAX_CANDLES, DEFAULT_MAX_LINE_POINTS, lttb, resample_ohlc
+from utils.fmp_client import FMPError
+from utils.price_store import get_prices
+from utils.ranking import (NASDAQ_100, TOP_N, UNIVERSE_LABELS, RunningTopK, fetch_constituents, stream_scores,
+                           top_ranked)
+from utils.ranking_snapshot import DEFAULT_STALE_AFTER_HOURS, load_latest_snapshot, snapshot_age, snapshot_scores
+from utils.shared_functions import get_setting
 
 
 ONE_DAY = 24*3600
-
-SUCCESSFUL_REQUEST = 200
+TABLE_REFRESH_SECONDS = 0.5
 
 
 def render_ETF(etf):
@@ -58,127 +64,117 @@ def render_ETF(etf):
         start_date = None
         interval = "1day"
 
-    api_key = st.secrets["fmp_api_key"]
-    
-    if start_date:
-        url = f"https://financialmodelingprep.com/api/v3/historical-chart/{interval}/{etf}?from={start_date.strftime('%Y-%m-%d')}&to={end_date.strftime('%Y-%m-%d')}&apikey={api_key}"
-    else:
-        url = f"https://financialmodelingprep.com/api/v3/historical-chart/{interval}/{etf}?apikey={api_key}"
-        
-    response = requests.get(url)
-    if response.status_code == SUCCESSFUL_REQUEST:
-        data = response.json()
-        historical_data = pd.DataFrame(data)
-        historical_data['date'] = pd.to_datetime(historical_data['date'])
-        historical_data.set_index('date', inplace=True)
-        historical_data.sort_index(inplace=True)
-        
-        if chart_type == "Line":
-            st.line_chart(historical_data['close'])
-        else:  # Candlestick
-            fig = go.Figure(data=[go.Candlestick(x=historical_data.index,
-                open=historical_data['open'],
-                high=historical_data['high'],
-                low=historical_data['low'],
-                close=historical_data['close'])])
-            
-            # to avoid displaying weekends and non-market days
-            fig.update_layout(
-                xaxis={
-                    'type': 'category',
-                    'title': 'Date'
-                },
-                yaxis={'title': 'Price'},
-                xaxis_rangeslider_visible=False
-            )
-            
-            st.plotly_chart(fig)
-
-
-def recommend_from_nasdaq100():
-    @st.cache_data(ttl=ONE_DAY) 
-    def fetch_nasdaq100_data(api_key):
-        url = f"https://financialmodelingprep.com/api/v3/nasdaq_constituent?apikey={api_key}"
-        response = requests.get(url)
-        return response.json()
+    try:
+        prices = get_prices(etf, interval, start_date, end_date if start_date else None)
+    except FMPError as e:
+        st.error(f"Could not fetch price data for {etf}: {e}")
+        return
+
+    with metrics.span("chart_build", chart="etf", type=chart_type):
+        if len(prices):
+            # Downsample so long histories don't send tens of thousands of points to the browser
+            if chart_type == "Line":
+                prices = prices[lttb(prices['date'], prices['close'], int(get_setting("chart_max_points", DEFAULT_MAX_LINE_POINTS)))]
+            else:
+                prices = resample_ohlc(prices, int(get_setting("chart_max_candles", DEFAULT_MAX_CANDLES)))
 
-    @st.cache_data(ttl=ONE_DAY) 
-    def get_ratings_and_net_incomes(api_key, symbols):
-        symbol_rating = {}
-        net_incomes = {}
+            historical_data = pd.DataFrame(
+                {column: prices[column] for column in ('open', 'high', 'low', 'close')},
+                index=pd.DatetimeIndex(prices['date'], name='date')
+            )
         
-        for symbol in symbols:
-            if symbol == "GOOG":  # Skip GOOG in favor of GOOGL since GOOGL provides voting rights for shareholders
-                continue
-            symbol_rating[symbol] = get_average_recommendation_rating(symbol)
+            if chart_type == "Line":
+                st.line_chart(historical_data['close'])
+            else:  # Candlestick
+                fig = go.Figure(data=[go.Candlestick(x=historical_data.index,
+                    open=historical_data['open'],
+                    high=historical_data['high'],
+                    low=historical_data['low'],
+                    close=historical_data['close'])])
             
-            url = f"https://financialmodelingprep.com/stable/income-statement?symbol={symbol}&apikey={api_key}"
-            response = requests.get(url)
-            if response.status_code == SUCCESSFUL_REQUEST:
-                data = response.json()
-                if data:
-                    net_incomes[symbol] = data[0]['netIncome']
-                    
-        return symbol_rating, net_incomes
-
-    api_key = st.secrets["fmp_api_key"]
-    
-    constituents = fetch_nasdaq100_data(api_key)
-    
-    # Create a mapping of symbols to company names
-    symbol_to_name = {constituent['symbol']: constituent['name'] for constituent in constituents}
-    symbols = list(symbol_to_name.keys())
-    
-    symbol_rating, net_incomes = get_ratings_and_net_incomes(api_key, symbols)
-    
-    # Sort by rating first, then by net income for ties, and get top 10
-    sorted_symbol_rating = dict(list(sorted(symbol_rating.items(),
-        key=lambda x: (x[1], net_incomes.get(x[0], 0)),
-        reverse=True))[:10])
-    
-    st.write("### Top 10 Recommendations")
+                # to avoid displaying weekends and non-market days
+                fig.update_layout(
+                    xaxis={
+                        'type': 'category',
+                        'title': 'Date'
+                    },
+                    yaxis={'title': 'Price'},
+                    xaxis_rangeslider_visible=False
+                )
+            
+                st.plotly_chart(fig)
+
+
+@st.cache_data(ttl=ONE_DAY)
+def fetch_universe(universe):
+    return fetch_constituents(universe)
+
+
+@st.cache_resource
+def live_rankings():
+    # Finished live rankings by universe, shared by every session in the process
+    return {}
+
+
+def recommendations_table(ranked_symbols, symbol_to_name):
+    return pd.DataFrame([{"Symbol": symbol, "Company Name": symbol_to_name.get(symbol, "")} for symbol in ranked_symbols])
+
+
+def rank_live(symbol_to_name):
+    # Scores stream in with a bounded number of requests in flight; a running top-K keeps the table
+    # current without holding every score, so memory stays flat for universes of thousands of stocks
+    top = RunningTopK()
+    progress = st.progress(0.0, text=f"Ranking {len(symbol_to_name):,} stocks...")
+    table = st.empty()
+    last_render = 0.0
+    for count, (symbol, rating, net_income) in enumerate(stream_scores(symbol_to_name), 1):
+        top.push(symbol, rating, net_income)
+        if time.monotonic() - last_render >= TABLE_REFRESH_SECONDS or count == len(symbol_to_name):
+            table.dataframe(recommendations_table(top.ranked(), symbol_to_name), hide_index=True)
+            progress.progress(count / len(symbol_to_name), text=f"Ranked {count:,} of {len(symbol_to_name):,} stocks...")
+            last_render = time.monotonic()
+    progress.empty()
+    table.empty()
+    return top.ranked()
+
+
+def recommend_from_universe(universe=NASDAQ_100):
+    # The snapshot job (python -m utils.ranking_snapshot) precomputes the ranking; only rank live without a
+    # snapshot it has checked recently
+    snapshot = load_latest_snapshot(universe)
+    max_age_hours = float(get_setting("ranking_snapshot_max_age_hours", DEFAULT_STALE_AFTER_HOURS))
+    if snapshot is not None and snapshot_age(snapshot) >= max_age_hours * 3600:
+        snapshot = None
+    finished = live_rankings().get(universe)
+    if snapshot is not None:
+        symbol_to_name = snapshot["constituents"]
+        ranked_symbols = top_ranked(*snapshot_scores(snapshot))
+        ranked_at = snapshot.get("checked_at", snapshot["created_at"])
+    elif finished is not None and time.time() - finished["ranked_at"] < ONE_DAY:
+        symbol_to_name, ranked_symbols, ranked_at = finished["names"], finished["ranked"], finished["ranked_at"]
+    else:
+        try:
+            symbol_to_name = fetch_universe(universe)
+        except FMPError as e:
+            st.error(f"Could not fetch the {UNIVERSE_LABELS[universe]} constituents: {e}")
+            return
+        ranked_symbols = None
+        ranked_at = time.time()
+
+    st.write(f"### Top {TOP_N} Recommendations")
     st.write("For optimal diversification, consider investing equally in each of these recommended stocks.")
-    
-    # Create a DataFrame for better display
-    recommendations_data = []
-    for symbol, rating in sorted_symbol_rating.items():
-        recommendations_data.append({
-            "Symbol": symbol,
-            "Company Name": symbol_to_name[symbol],
-            # "Rating": round(rating, 5),
-            # "Net Income": f"${net_incomes[symbol]:,.2f}"
-        })
-    
-    df = pd.DataFrame(recommendations_data)
-    st.dataframe(df, hide_index=True)
+    if ranked_symbols is None:
+        ranked_symbols = rank_live(symbol_to_name)
+        symbol_to_name = {symbol: symbol_to_name[symbol] for symbol in ranked_symbols}
+        live_rankings()[universe] = {"names": symbol_to_name, "ranked": ranked_symbols, "ranked_at": ranked_at}
+    st.dataframe(recommendations_table(ranked_symbols, symbol_to_name), hide_index=True)
+    st.caption(f"{UNIVERSE_LABELS[universe]} ranking as of {datetime.fromtimestamp(ranked_at):%Y-%m-%d %H:%M}.")
 
-
-def is_stock(symbol):
-    try:
-        fmp_api_key = st.secrets["fmp_api_key"]
-        url = f"https://financialmodelingprep.com/api/v3/profile/{symbol}?apikey={fmp_api_key}"
-        response = requests.get(url)
-        
-        if response.status_code == SUCCESSFUL_REQUEST:
-            data = response.json()
-
-            print(f"\n\n\nin_stock(symbol) data = {data};\n type of data = {type(data)}\n\n\n")
-
-            is_etf = data[0]["isEtf"]
-            is_fund = data[0]["isFund"]
-            is_actively_trading = data[0]["isActivelyTrading"]
-            if is_actively_trading:
-                if is_etf or is_fund:
-                    return False
-                return True
-            else:
-                return False  # ignore stocks that are not actively trading
-            
-    except Exception as e:
-        print(f"Error checking if {symbol} is a stock: {e}")
-        return False
+    st.session_state["recommended_symbols"] = list(ranked_symbols)
+    st.write("Open the **Portfolio Backtester** page to see how investing equally in these stocks would have performed.")
 
 
+@metrics.traced_page
 def main():
     st.title("Stock Recommender")
 
@@ -221,7 +217,13 @@ def main():
         case 2:
             render_ETF("QQQM")
         case 3:
-            recommend_from_nasdaq100()
+            universe = st.selectbox(
+                "Which stocks should the recommendations come from?",
+                list(UNIVERSE_LABELS),
+                format_func=UNIVERSE_LABELS.get,
+                help="Larger universes take longer to rank the first time"
+            )
+            recommend_from_universe(universe)
     
     st.markdown("---")
     st.markdown("""
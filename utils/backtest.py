@@ -0,0 +1,89 @@
+from typing import NamedTuple
+
+import numpy as np
+
+from utils.dca import purchase_schedule, simulate_dca
+from utils.trading_calendar import sessions_in_range
+from utils.xirr import xirr
+
+
+class BacktestResult(NamedTuple):
+    symbols: list
+    dates: np.ndarray  # datetime64[D] sessions in the backtest
+    holding_values: np.ndarray  # sessions x holdings market value
+    holding_invested: np.ndarray  # sessions x holdings cumulative amount invested
+    value: np.ndarray  # portfolio value per session
+    invested: np.ndarray  # cumulative amount invested per session
+    drawdown: np.ndarray  # time-weighted drawdown from the running peak, <= 0
+    annual_irr: float
+
+
+def align_closes(prices_by_symbol, start, end):
+    # Puts every symbol's closes on the NYSE sessions from start to end as a sessions x symbols array.
+    # Gaps are forward-filled, and sessions before the youngest symbol's first close are dropped.
+    symbols = list(prices_by_symbol)
+    sessions = sessions_in_range(start, end)
+    closes = np.full((len(sessions), len(symbols)), np.nan)
+
+    for column, symbol in enumerate(symbols):
+        prices = prices_by_symbol[symbol]
+        days = prices['date'].astype('datetime64[D]')
+        rows = np.searchsorted(sessions, days)
+        on_session = rows < len(sessions)
+        on_session[on_session] = sessions[rows[on_session]] == days[on_session]
+        closes[rows[on_session], column] = prices['close'][on_session]
+
+    has_close = ~np.isnan(closes)
+    last_close_row = np.where(has_close, np.arange(len(sessions))[:, None], 0)
+    np.maximum.accumulate(last_close_row, axis=0, out=last_close_row)
+    closes = closes[last_close_row, np.arange(len(symbols))]
+
+    first_complete_row = has_close.argmax(axis=0).max() if has_close.any(axis=0).all() else len(sessions)
+    return symbols, sessions[first_complete_row:], closes[first_complete_row:]
+
+
+def time_weighted_drawdown(value, contributions):
+    # Drawdown of the portfolio's unit value, so new contributions don't hide losses
+    previous_value = value[:-1]
+    session_growth = np.divide(value[1:] - contributions[1:], previous_value,
+                               out=np.ones_like(previous_value), where=previous_value > 0)
+    unit_value = np.concatenate(([1.0], np.cumprod(session_growth)))
+    return unit_value / np.maximum.accumulate(unit_value) - 1
+
+
+def run_backtest(symbols, dates, closes, weights, frequency, amount):
+    # Invests amount on each scheduled session, split across the holdings by weight
+    weights = np.asarray(weights, dtype=np.float64)
+    weights = weights / weights.sum()
+
+    buy_indices = purchase_schedule(dates, frequency)
+    holdings = simulate_dca(closes, buy_indices, amount * weights)
+    value = holdings.value.sum(axis=1)
+    contributions = holdings.contributions.sum(axis=1)
+
+    annual_irr = xirr(np.append(-contributions[buy_indices], value[-1]), np.append(dates[buy_indices], dates[-1]))
+    return BacktestResult(
+        symbols=list(symbols),
+        dates=dates,
+        holding_values=holdings.value,
+        holding_invested=holdings.invested,
+        value=value,
+        invested=holdings.invested.sum(axis=1),
+        drawdown=time_weighted_drawdown(value, contributions),
+        annual_irr=annual_irr,
+    )
+
+
+def attribution(result):
+    # Per-holding amount invested, final value, profit and share of the portfolio's total profit
+    invested = result.holding_invested[-1]
+    final_value = result.holding_values[-1]
+    profit = final_value - invested
+    total_profit = profit.sum()
+    return {
+        "Symbol": result.symbols,
+        "Invested": invested,
+        "Final Value": final_value,
+        "Profit": profit,
+        "Share of Profit": profit / total_profit if total_profit else np.zeros_like(profit),
+    }
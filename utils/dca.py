@@ -0,0 +1,92 @@
+from typing import NamedTuple
+
+import numpy as np
+
+DAILY = "Daily"
+MONTHLY = "Monthly"
+YEARLY = "Yearly"
+CUSTOM = "Custom"
+# The calendar period holding one scheduled buy
+PERIOD_UNITS = {MONTHLY: "datetime64[M]", YEARLY: "datetime64[Y]"}
+
+
+class DCAResult(NamedTuple):
+    contributions: np.ndarray  # amount invested at each session's close (0 on sessions without a buy)
+    shares: np.ndarray  # cumulative shares held after each session
+    invested: np.ndarray  # cumulative amount invested after each session
+    value: np.ndarray  # market value of the holding at each session's close
+
+
+def purchase_schedule(dates, frequency, custom_dates=None):
+    # Indices into the sorted session dates on which a purchase is made. Monthly and yearly buys
+    # happen on the first session of each calendar month/year inside the range; custom dates
+    # that fall on a non-trading day roll forward to the next session.
+    days = np.asarray(dates).astype("datetime64[D]")
+    if len(days) == 0:
+        return np.empty(0, dtype=np.intp)
+
+    if frequency == DAILY:
+        return np.arange(len(days))
+    if frequency == CUSTOM:
+        indices = np.searchsorted(days, np.asarray(custom_dates, dtype="datetime64[D]"), side="left")
+        return np.unique(indices[indices < len(days)])
+    if frequency not in PERIOD_UNITS:
+        raise ValueError(f"Unknown purchase frequency {frequency!r}")
+    periods = days.astype(PERIOD_UNITS[frequency])
+
+    is_first_of_period = np.empty(len(days), dtype=bool)
+    is_first_of_period[0] = True
+    np.not_equal(periods[1:], periods[:-1], out=is_first_of_period[1:])
+    return np.flatnonzero(is_first_of_period)
+
+
+def simulate_dca(closes, buy_indices, amount):
+    # closes is one price series or a sessions x holdings array; amount is anything that broadcasts
+    # against a row of closes for each buy (a scalar, one amount per holding, or one per buy index)
+    closes = np.asarray(closes, dtype=np.float64)
+    buy_indices = np.asarray(buy_indices, dtype=np.intp)
+
+    contributions = np.zeros_like(closes)
+    np.add.at(contributions, buy_indices, amount)
+    shares = np.cumsum(contributions / closes, axis=0)
+    invested = np.cumsum(contributions, axis=0)
+    return DCAResult(contributions, shares, invested, shares * closes)
+
+
+class RollingDCAResult(NamedTuple):
+    start_indices: np.ndarray  # session of each window's first buy
+    end_indices: np.ndarray  # last session inside each window, where it is valued
+    invested: np.ndarray  # amount invested over each window
+    value: np.ndarray  # market value of each window's holding at its last session
+    returns: np.ndarray  # value / invested - 1
+
+
+def rolling_dca(dates, closes, buy_indices, amount, window_days, frequency=DAILY):
+    # The outcome of buying a fixed amount on the schedule for window_days, for every window that starts
+    # on a scheduled buy and fits in the history. A window is half-open: it holds the buys strictly before
+    # its end. Monthly and yearly windows are measured from the start of the first buy's month/year, so
+    # an N-year window holds exactly one buy per period even when that buy was late in its period.
+    # A prefix sum of shares bought per dollar over the buys gives each window's shares as one difference,
+    # so all windows together take a single pass.
+    days = np.asarray(dates).astype("datetime64[D]")
+    closes = np.asarray(closes, dtype=np.float64)
+    buy_indices = np.asarray(buy_indices, dtype=np.intp)
+
+    shares_per_dollar = np.zeros(len(buy_indices) + 1)
+    np.cumsum(1 / closes[buy_indices], out=shares_per_dollar[1:])
+
+    buy_days = days[buy_indices]
+    window_starts = buy_days
+    if frequency in PERIOD_UNITS:
+        window_starts = buy_days.astype(PERIOD_UNITS[frequency]).astype("datetime64[D]")
+    window_ends = window_starts + np.timedelta64(int(window_days), "D")
+    complete = window_ends <= days[-1] if len(days) else np.zeros(0, dtype=bool)
+    first_buys = np.flatnonzero(complete)
+    # Sessions and buys are both sorted, so each window's last session and buy are a binary search away
+    end_indices = np.searchsorted(days, window_ends[complete], side="left") - 1
+    buys_after_window = np.searchsorted(buy_days, window_ends[complete], side="left")
+
+    invested = amount * (buys_after_window - first_buys)
+    shares = amount * (shares_per_dollar[buys_after_window] - shares_per_dollar[first_buys])
+    value = shares * closes[end_indices]
+    return RollingDCAResult(buy_indices[first_buys], end_indices, invested, value, value / invested - 1)
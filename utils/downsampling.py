@@ -0,0 +1,56 @@
+import math
+
+import numpy as np
+
+DEFAULT_MAX_CANDLES = 1_000
+DEFAULT_MAX_LINE_POINTS = 2_000
+
+
+def resample_ohlc(prices, max_bars=DEFAULT_MAX_CANDLES):
+    # Merges runs of consecutive bars so at most max_bars remain: each merged bar opens at the first
+    # open, closes at the last close and spans the highest high and lowest low of its run
+    num_of_bars = len(prices)
+    if num_of_bars <= max_bars:
+        return prices
+
+    bars_per_bucket = math.ceil(num_of_bars / max_bars)
+    starts = np.arange(0, num_of_bars, bars_per_bucket)
+    ends = np.append(starts[1:], num_of_bars) - 1
+
+    resampled = np.empty(len(starts), dtype=prices.dtype)
+    resampled['date'] = prices['date'][starts]
+    resampled['open'] = prices['open'][starts]
+    resampled['high'] = np.fmax.reduceat(prices['high'], starts)
+    resampled['low'] = np.fmin.reduceat(prices['low'], starts)
+    resampled['close'] = prices['close'][ends]
+    if 'volume' in prices.dtype.names:
+        resampled['volume'] = np.add.reduceat(prices['volume'], starts)
+    return resampled
+
+
+def lttb(x, y, max_points=DEFAULT_MAX_LINE_POINTS):
+    # Largest-Triangle-Three-Buckets: indices of at most max_points points that keep the visual shape of
+    # the line. The first and last points are always kept; from each bucket in between the point forming
+    # the largest triangle with the previously kept point and the next bucket's average is kept.
+    num_of_points = len(y)
+    if num_of_points <= max_points or max_points < 3:
+        return np.arange(num_of_points)
+
+    x = np.asarray(x).astype(np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    bucket_edges = (np.floor(np.arange(max_points - 1) * (num_of_points - 2) / (max_points - 2)) + 1).astype(np.intp)
+    bucket_edges[-1] = num_of_points - 1
+
+    selected = np.empty(max_points, dtype=np.intp)
+    selected[0] = previous = 0
+    for bucket in range(max_points - 2):
+        start, end = bucket_edges[bucket], bucket_edges[bucket + 1]
+        next_end = bucket_edges[bucket + 2] if bucket + 2 < len(bucket_edges) else num_of_points
+        average_x = x[end:next_end].mean()
+        average_y = y[end:next_end].mean()
+        areas = np.abs((x[previous] - average_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (average_y - y[previous]))
+        previous = start + int(areas.argmax())
+        selected[bucket + 1] = previous
+    selected[-1] = num_of_points - 1
+    return selected
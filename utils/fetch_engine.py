@@ -0,0 +1,106 @@
+import contextvars
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+
+# Stays below the FMP client's connection pool size so workers never wait on a socket
+DEFAULT_MAX_WORKERS = 16
+
+
+def fetch_all(fetch, keys, max_workers=DEFAULT_MAX_WORKERS):
+    # Runs fetch(key) for every key on a bounded thread pool. A failing key is reported in
+    # errors instead of aborting the batch, so callers can degrade per key.
+    keys = list(keys)
+    results = {}
+    errors = {}
+    if not keys:
+        return results, errors
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(keys))) as executor:
+        # Each task runs in a copy of the caller's context, so metrics spans land in the caller's trace
+        futures = {executor.submit(contextvars.copy_context().run, fetch, key): key for key in keys}
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                results[key] = future.result()
+            except Exception as e:
+                errors[key] = e
+    return results, errors
+
+
+def fetch_stream(fetch, keys, max_workers=DEFAULT_MAX_WORKERS, max_in_flight=None):
+    # Yields (key, result, error) in completion order. Keys are pulled lazily and at most max_in_flight
+    # fetches are pending at a time, so memory stays flat however many keys there are.
+    max_in_flight = max_in_flight or 2 * max_workers
+    keys = iter(keys)
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        def submit_next():
+            for key in keys:
+                in_flight[executor.submit(contextvars.copy_context().run, fetch, key)] = key
+                return True
+            return False
+
+        try:
+            while len(in_flight) < max_in_flight and submit_next():
+                pass
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = in_flight.pop(future)
+                    submit_next()
+                    try:
+                        result, error = future.result(), None
+                    except Exception as e:
+                        result, error = None, e
+                    yield key, result, error
+        finally:
+            # A consumer that stops early only waits for the fetches already running
+            for future in in_flight:
+                future.cancel()
+
+
+def run_with_deadlines(tasks, timeouts, max_workers=DEFAULT_MAX_WORKERS):
+    # Starts every named task at once and yields (name, result, error) as each one finishes. A task
+    # still running at its timeout is yielded with a TimeoutError and left to finish in the background.
+    if not tasks:
+        return
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(tasks)))
+    started = time.monotonic()
+    futures = {executor.submit(contextvars.copy_context().run, task): name for name, task in tasks.items()}
+    executor.shutdown(wait=False)
+    deadlines = {future: started + timeouts[name] for future, name in futures.items()}
+
+    pending = set(futures)
+    while pending:
+        next_deadline = min(deadlines[future] for future in pending)
+        done, _ = wait(pending, timeout=max(0.0, next_deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+        for future in done:
+            pending.discard(future)
+            try:
+                result, error = future.result(), None
+            except Exception as e:
+                result, error = None, e
+            yield futures[future], result, error
+        now = time.monotonic()
+        for future in [future for future in pending if deadlines[future] <= now]:
+            pending.discard(future)
+            yield futures[future], None, TimeoutError(f"{futures[future]} did not finish in {timeouts[futures[future]]}s")
+
+
+class FetchPlan:
+    # Starts every named fetch concurrently up front and memoizes the outcome, so one page render can
+    # ask for the same record from several functions while the endpoint is hit only once
+    def __init__(self, fetches, max_workers=DEFAULT_MAX_WORKERS):
+        self._futures = {}
+        if not fetches:
+            return
+        executor = ThreadPoolExecutor(max_workers=min(max_workers, len(fetches)))
+        self._futures = {name: executor.submit(contextvars.copy_context().run, fetch) for name, fetch in fetches.items()}
+        executor.shutdown(wait=False)
+
+    def __contains__(self, name):
+        return name in self._futures
+
+    def get(self, name):
+        # Blocks until this fetch is done, then returns its result or re-raises its exception
+        return self._futures[name].result()
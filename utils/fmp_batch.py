@@ -0,0 +1,100 @@
+import json
+import logging
+
+from utils import metrics, response_cache
+from utils.fetch_engine import fetch_all
+from utils.fmp_client import FMPError, fmp_get_bytes, fmp_get_first, parse_response
+from utils.shared_functions import get_setting
+
+logger = logging.getLogger(__name__)
+
+# Endpoints that accept a comma-separated symbol list in place of a single symbol. The ratios, metrics
+# and rating endpoints the ranking scores use take one symbol per request, so they can't be batched.
+BATCH_ENDPOINTS = {
+    "profile": "api/v3/profile/{}",
+}
+# Keeps request URLs well below common proxy limits
+DEFAULT_BATCH_SIZE = 50
+
+
+def get_batch_size():
+    return max(1, int(get_setting("fmp_batch_size", DEFAULT_BATCH_SIZE)))
+
+
+def _single_path(endpoint, symbol):
+    return BATCH_ENDPOINTS[endpoint].format(symbol)
+
+
+def _cached_record(endpoint, symbol):
+    body = response_cache.get(response_cache.make_key(_single_path(endpoint, symbol)))
+    metrics.increment("fmp_cache_lookups", endpoint=endpoint, result="miss" if body is None else "hit")
+    if body is None:
+        return None
+    data = parse_response(body, _single_path(endpoint, symbol), list)
+    return data[0] if data else None
+
+
+def _cache_record(endpoint, symbol, record):
+    # Stored under the single-symbol key so a later one-symbol lookup of either kind is a cache hit
+    path = _single_path(endpoint, symbol)
+    response_cache.put(response_cache.make_key(path), json.dumps([record]).encode(),
+                       response_cache.ttl_for(endpoint, path))
+
+
+def _fetch_chunk(endpoint, chunk):
+    path = _single_path(endpoint, ",".join(chunk))
+    try:
+        return parse_response(fmp_get_bytes(path, use_cache=False), path, list)
+    except FMPError:
+        if len(chunk) == 1:
+            raise
+    # Some FMP plans reject multi-symbol requests, with an error status or an error body, so fall back
+    # to one request per symbol
+    results, errors = fetch_all(lambda symbol: fmp_get_bytes(_single_path(endpoint, symbol), use_cache=False), chunk)
+    records = []
+    for symbol, body in results.items():
+        records.extend(parse_response(body, _single_path(endpoint, symbol), list))
+    if errors and not records:
+        raise next(iter(errors.values()))
+    return records
+
+
+def fetch_records(endpoint, symbols, use_cache=True):
+    # Returns {symbol: record} for every symbol FMP knows, fetching uncached symbols in chunked
+    # multi-symbol requests. Unknown symbols and symbols in failed chunks are simply absent.
+    symbols = list(dict.fromkeys(symbol.strip().upper() for symbol in symbols if symbol.strip()))
+    use_cache = use_cache and response_cache.is_enabled()
+
+    records = {}
+    if use_cache:
+        for symbol in symbols:
+            record = _cached_record(endpoint, symbol)
+            if record is not None:
+                records[symbol] = record
+    missing = [symbol for symbol in symbols if symbol not in records]
+
+    batch_size = get_batch_size()
+    chunks = [tuple(missing[i:i + batch_size]) for i in range(0, len(missing), batch_size)]
+    results, errors = fetch_all(lambda chunk: _fetch_chunk(endpoint, chunk), chunks)
+    for chunk, error in errors.items():
+        logger.warning("Error fetching %s for %d symbols: %s", endpoint, len(chunk), error)
+
+    requested = set(missing)
+    for chunk_records in results.values():
+        for record in chunk_records:
+            symbol = str(record.get("symbol", "")).upper()
+            if symbol not in requested:
+                continue
+            records[symbol] = record
+            if use_cache:
+                _cache_record(endpoint, symbol, record)
+    return records
+
+
+def fetch_profiles(symbols, use_cache=True):
+    return fetch_records("profile", symbols, use_cache)
+
+
+def get_profile(symbol, use_cache=True):
+    # One symbol needs no batching, so its response is cached as it comes back from FMP
+    return fmp_get_first(_single_path("profile", symbol.strip().upper()), use_cache=use_cache)
@@ -0,0 +1,144 @@
+import json
+import threading
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils import metrics, response_cache
+from utils.shared_functions import get_setting
+
+DEFAULT_BASE_URL = "https://financialmodelingprep.com"
+SUCCESSFUL_REQUEST = 200
+
+POOL_SIZE = 32
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5
+BACKOFF_JITTER = 0.5
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# FMP error bodies are short JSON objects, so only the start of a body needs checking
+ERROR_BODY_MARKER = b'"Error Message"'
+ERROR_BODY_PREFIX_BYTES = 256
+
+CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 10
+# Price histories and news are large payloads, so they get a longer read timeout
+READ_TIMEOUTS = {
+    "historical-chart": 30,
+    "historical-price-full": 30,
+    "stock_news": 15,
+    "nasdaq_constituent": 15,
+    "sp500_constituent": 15,
+    "stock-screener": 30,
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class FMPError(requests.exceptions.RequestException):
+    pass
+
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=MAX_RETRIES,
+                backoff_factor=BACKOFF_FACTOR,
+                backoff_jitter=BACKOFF_JITTER,
+                status_forcelist=RETRY_STATUS_CODES,
+                allowed_methods=frozenset({"GET"}),
+                respect_retry_after_header=True,
+                raise_on_status=False
+            )
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+    return _session
+
+
+def endpoint_name(path):
+    # "api/v3/historical-chart/1min/AAPL" -> "historical-chart", "stable/income-statement" -> "income-statement"
+    parts = path.strip("/").split("/")
+    if parts[0] == "api":
+        parts = parts[2:]
+    elif parts[0] == "stable":
+        parts = parts[1:]
+    return parts[0]
+
+
+def fmp_get_bytes(path, params=None, use_cache=True):
+    endpoint = endpoint_name(path)
+    use_cache = use_cache and response_cache.is_enabled()
+    if use_cache:
+        cache_key = response_cache.make_key(path, params)
+        body = response_cache.get(cache_key)
+        metrics.increment("fmp_cache_lookups", endpoint=endpoint, result="miss" if body is None else "hit")
+        if body is not None:
+            return body
+
+    query = dict(params or {})
+    query["apikey"] = get_setting("fmp_api_key")
+    url = f"{get_setting('fmp_base_url', DEFAULT_BASE_URL)}/{path.lstrip('/')}"
+    timeout = (CONNECT_TIMEOUT, READ_TIMEOUTS.get(endpoint, DEFAULT_READ_TIMEOUT))
+
+    try:
+        with metrics.span("fmp_request", endpoint=endpoint):
+            response = get_session().get(url, params=query, timeout=timeout)
+    except requests.exceptions.RequestException as e:
+        metrics.increment("fmp_requests", endpoint=endpoint, status="error")
+        raise FMPError(f"Request to {endpoint} failed: {type(e).__name__}") from e
+    metrics.increment("fmp_requests", endpoint=endpoint, status=response.status_code)
+
+    if response.status_code != SUCCESSFUL_REQUEST:
+        raise FMPError(f"{endpoint} returned HTTP {response.status_code}", response=response)
+
+    body = response.content
+    if use_cache and ERROR_BODY_MARKER not in body[:ERROR_BODY_PREFIX_BYTES]:
+        response_cache.put(cache_key, body, response_cache.ttl_for(endpoint, path, params))
+    return body
+
+
+def parse_response(body, path, expect=None):
+    endpoint = endpoint_name(path)
+    try:
+        data = json_loads(body)
+    except ValueError as e:
+        raise FMPError(f"{endpoint} returned malformed JSON") from e
+
+    # FMP reports bad keys and exhausted quotas as a 200 with an error body
+    if isinstance(data, dict) and "Error Message" in data:
+        raise FMPError(f"{endpoint}: {data['Error Message']}")
+    if expect is not None and not isinstance(data, expect):
+        raise FMPError(f"{endpoint} returned {type(data).__name__}, expected {expect.__name__}")
+    return data
+
+
+def fmp_get(path, params=None, expect=None, use_cache=True):
+    return parse_response(fmp_get_bytes(path, params, use_cache), path, expect)
+
+
+def fmp_get_list(path, params=None, use_cache=True):
+    return fmp_get(path, params, list, use_cache)
+
+
+def fmp_get_dict(path, params=None, use_cache=True):
+    return fmp_get(path, params, dict, use_cache)
+
+
+def fmp_get_first(path, params=None, use_cache=True):
+    data = fmp_get_list(path, params, use_cache)
+    if not data:
+        raise FMPError(f"{endpoint_name(path)} returned no records")
+    return data[0]
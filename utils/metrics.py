@@ -0,0 +1,209 @@
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+import streamlit as st
+
+from utils.shared_functions import get_setting, is_setting_enabled
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = "financial_planner"
+METRICS_PATH = "/metrics"
+
+# Process-wide totals, exported on the Prometheus endpoint
+_counters = defaultdict(float)
+_span_counts = defaultdict(int)
+_span_seconds = defaultdict(float)
+_lock = threading.Lock()
+
+# The events of the page render that is running; worker threads see it because fetch_engine
+# runs their tasks in a copy of the submitting thread's context
+_trace = contextvars.ContextVar("metrics_trace", default=None)
+# Whether the running page logs its spans, read from metrics_log once per trace
+_log_spans = contextvars.ContextVar("metrics_log_spans", default=False)
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _record(event):
+    trace = _trace.get()
+    if trace is not None:
+        trace.append(event)
+
+
+def increment(name, value=1, **labels):
+    with _lock:
+        _counters[(name, _label_key(labels))] += value
+    _record({"type": "counter", "name": name, "labels": labels, "value": value})
+
+
+@contextmanager
+def span(name, **labels):
+    # Times the block; the span is recorded even when the block raises
+    start = time.perf_counter()
+    started_at = time.time()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        key = (name, _label_key(labels))
+        with _lock:
+            _span_counts[key] += 1
+            _span_seconds[key] += seconds
+        _record({"type": "span", "name": name, "labels": labels, "seconds": seconds,
+                 "started_at": started_at, "thread": threading.current_thread().name})
+        if _log_spans.get():
+            label_text = " ".join(f"{label}={value}" for label, value in _label_key(labels))
+            logger.info("span %s %s %.1fms", name, label_text, seconds * 1000)
+
+
+def start_trace():
+    # Called at the top of a page so the debug panel only shows this rerun's events
+    trace = []
+    _trace.set(trace)
+    log_spans = is_setting_enabled("metrics_log", default=False)
+    _log_spans.set(log_spans)
+    if log_spans and not logger.handlers:
+        # Without a handler of its own, logging would drop the INFO lines
+        logger.addHandler(logging.StreamHandler())
+        logger.setLevel(logging.INFO)
+    start_metrics_server()
+    return trace
+
+
+def get_trace():
+    return _trace.get() or []
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (name + '="' + value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+               for name, value in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+def render_prometheus():
+    # Prometheus text exposition format: counters as <name>_total, spans as a summary per span name
+    with _lock:
+        counters = dict(_counters)
+        span_counts = dict(_span_counts)
+        span_seconds = dict(_span_seconds)
+
+    lines = []
+    for counter in sorted({name for name, _ in counters}):
+        metric = f"{METRIC_PREFIX}_{counter}_total"
+        lines.append(f"# TYPE {metric} counter")
+        for (name, labels), value in sorted(counters.items()):
+            if name == counter:
+                lines.append(f"{metric}{_format_labels(labels)} {value:g}")
+    for span_name in sorted({name for name, _ in span_counts}):
+        metric = f"{METRIC_PREFIX}_{span_name}_seconds"
+        lines.append(f"# TYPE {metric} summary")
+        for (name, labels), count in sorted(span_counts.items()):
+            if name == span_name:
+                lines.append(f"{metric}_count{_format_labels(labels)} {count}")
+                lines.append(f"{metric}_sum{_format_labels(labels)} {span_seconds[(name, labels)]:.6f}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != METRICS_PATH:
+            self.send_error(404)
+            return
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server():
+    # Serves /metrics on the metrics_port setting; off unless that setting is present. Only the first
+    # Streamlit session in the process binds the port.
+    global _server
+    port = get_setting("metrics_port")
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((get_setting("metrics_host", "127.0.0.1"), int(port)), MetricsHandler)
+            except OSError as e:
+                logger.warning("Could not serve metrics on port %s: %s", port, e)
+                _server = False
+                return None
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+    return _server or None
+
+
+def traced_page(main):
+    # Wraps a page's main() so each rerun starts a fresh trace and ends with the debug panel,
+    # including reruns cut short by st.stop()
+    @functools.wraps(main)
+    def wrapper(*args, **kwargs):
+        start_trace()
+        try:
+            page = os.path.splitext(os.path.basename(main.__code__.co_filename))[0]
+            with span("page_render", page=page):
+                return main(*args, **kwargs)
+        finally:
+            render_debug_panel()
+    return wrapper
+
+
+def is_debug_panel_enabled():
+    return is_setting_enabled("debug_panel", default=False) or st.query_params.get("debug") == "1"
+
+
+def render_debug_panel():
+    # Timing breakdown of the current rerun; enable with the debug_panel setting or ?debug=1
+    if not is_debug_panel_enabled():
+        return
+    trace = get_trace()
+    spans = [event for event in trace if event["type"] == "span"]
+    counters = [event for event in trace if event["type"] == "counter"]
+
+    with st.expander("Debug: timing breakdown for this rerun"):
+        if not spans and not counters:
+            st.write("Nothing was recorded.")
+            return
+        if spans:
+            first_start = min(event["started_at"] for event in spans)
+            span_table = pd.DataFrame([{
+                "span": event["name"],
+                "labels": " ".join(f"{label}={value}" for label, value in event["labels"].items()),
+                "start (ms)": round((event["started_at"] - first_start) * 1000, 1),
+                "duration (ms)": round(event["seconds"] * 1000, 1),
+                "thread": event["thread"],
+            } for event in spans])
+            st.write("**Spans**")
+            st.dataframe(span_table.sort_values("start (ms)"), hide_index=True)
+            totals = span_table.groupby("span")["duration (ms)"].agg(["count", "sum", "max"]).reset_index()
+            st.dataframe(totals.sort_values("sum", ascending=False), hide_index=True)
+        if counters:
+            counter_table = pd.DataFrame([{
+                "counter": event["name"],
+                "labels": " ".join(f"{label}={value}" for label, value in event["labels"].items()),
+                "value": event["value"],
+            } for event in counters])
+            st.write("**Counters**")
+            st.dataframe(counter_table.groupby(["counter", "labels"])["value"].sum().reset_index(), hide_index=True)
@@ -0,0 +1,83 @@
+from operator import itemgetter
+
+import numpy as np
+
+from utils.fmp_client import parse_response
+
+PRICE_DTYPE = np.dtype([
+    ('date', 'datetime64[s]'),
+    ('open', 'f8'),
+    ('high', 'f8'),
+    ('low', 'f8'),
+    ('close', 'f8'),
+    ('volume', 'f8'),
+])
+
+DATE_LENGTH = len("2024-01-31")
+DATETIME_LENGTH = len("2024-01-31 09:30:00")
+ZERO = ord('0')
+
+
+def _digits(characters, start, end):
+    value = np.zeros(len(characters), dtype=np.int64)
+    for position in range(start, end):
+        value = value * 10 + (characters[:, position] - ZERO)
+    return value
+
+
+def parse_dates(strings):
+    # Parses FMP's "YYYY-MM-DD" and "YYYY-MM-DD HH:MM:SS" timestamps with array arithmetic on the raw
+    # bytes, which is several times faster than numpy's per-string parser; anything else falls back to it
+    raw = np.asarray(strings, dtype='S')
+    width = raw.dtype.itemsize
+    if len(raw) == 0 or width not in (DATE_LENGTH, DATETIME_LENGTH):
+        return raw.astype('datetime64[s]')
+
+    characters = raw.view(np.uint8).reshape(len(raw), width).astype(np.int64)
+    separators = {4: '-', 7: '-'}
+    if width == DATETIME_LENGTH:
+        separators.update({13: ':', 16: ':'})
+    if not all((characters[:, position] == ord(separator)).all() for position, separator in separators.items()):
+        return raw.astype('datetime64[s]')
+
+    months = (_digits(characters, 0, 4) - 1970) * 12 + _digits(characters, 5, 7) - 1
+    days = months.astype('datetime64[M]').astype('datetime64[D]') + (_digits(characters, 8, 10) - 1).astype('timedelta64[D]')
+    dates = days.astype('datetime64[s]')
+    if width == DATETIME_LENGTH:
+        seconds = _digits(characters, 11, 13) * 3600 + _digits(characters, 14, 16) * 60 + _digits(characters, 17, 19)
+        dates += seconds.astype('timedelta64[s]')
+    return dates
+
+
+def rows_to_array(rows):
+    # Builds the typed columns straight from the decoded rows, sorted by date. FMP sends bars newest
+    # first, so the common case is a reversed copy rather than a sort.
+    num_of_rows = len(rows)
+    prices = np.empty(num_of_rows, dtype=PRICE_DTYPE)
+    prices['date'] = parse_dates(list(map(itemgetter('date'), rows)))
+    for name in PRICE_DTYPE.names[1:]:
+        try:
+            prices[name] = np.fromiter(map(itemgetter(name), rows), dtype=np.float64, count=num_of_rows)
+        except (KeyError, TypeError):
+            # A missing price is NaN rather than a zero that would chart as a crash; missing volume is 0
+            missing = 0.0 if name == 'volume' else np.nan
+            prices[name] = [missing if row.get(name) is None else row[name] for row in rows]
+
+    # Bars without a close can't be valued or bought at, so they are dropped
+    if np.isnan(prices['close']).any():
+        prices = prices[~np.isnan(prices['close'])]
+        num_of_rows = len(prices)
+
+    dates = prices['date']
+    if num_of_rows < 2 or (dates[1:] >= dates[:-1]).all():
+        return prices
+    if (dates[1:] <= dates[:-1]).all():
+        return prices[::-1].copy()
+    return prices[np.argsort(dates, kind='stable')]
+
+
+def decode_prices(body, path):
+    # Decodes a historical-chart (list of bars) or historical-price-full ({"historical": [...]}) body
+    data = parse_response(body, path)
+    rows = data.get('historical', []) if isinstance(data, dict) else data
+    return rows_to_array(rows)
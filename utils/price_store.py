@@ -0,0 +1,168 @@
+import json
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+
+from utils import metrics, trading_calendar
+from utils.fmp_client import fmp_get_bytes
+from utils.price_decoder import PRICE_DTYPE, decode_prices
+from utils.response_cache import INTRADAY_TTL, get_cache_dir
+
+DAILY_INTERVAL = '1day'
+DAILY_REFRESH_SECONDS = 3 * INTRADAY_TTL
+INTRADAY_REFRESH_SECONDS = INTRADAY_TTL
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _lock_for(symbol, interval):
+    with _locks_guard:
+        return _locks.setdefault((symbol, interval), threading.Lock())
+
+
+def _paths(symbol, interval):
+    directory = os.path.join(get_cache_dir(), "prices", interval)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{symbol}.npy"), os.path.join(directory, f"{symbol}.json")
+
+
+def _to_date(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _replace_atomically(path, write):
+    temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporary_path, "wb") as file:
+        write(file)
+    os.replace(temporary_path, path)
+
+
+def fetch_prices(symbol, interval, start=None, end=None):
+    params = {}
+    if start is not None:
+        params["from"] = start.isoformat()
+    if end is not None:
+        params["to"] = end.isoformat()
+
+    # The store is the cache for price bars, so they are not duplicated in the response cache
+    if interval == DAILY_INTERVAL:
+        path = f"api/v3/historical-price-full/{symbol}"
+    else:
+        path = f"api/v3/historical-chart/{interval}/{symbol}"
+    return decode_prices(fmp_get_bytes(path, params, use_cache=False), path)
+
+
+def _end_fetched_at(coverage):
+    # Stores written before end_fetched_at was tracked only have fetched_at
+    return coverage.get("end_fetched_at", coverage["fetched_at"])
+
+
+def _last_session(day):
+    # The session on or before day, None when that is before the calendar index and so long closed
+    try:
+        return trading_calendar.previous_session(day)
+    except ValueError:
+        return None
+
+
+def _is_end_complete(coverage):
+    # Whether the last stored session had closed when its bars were fetched
+    last_session = _last_session(_to_date(coverage["end"]))
+    fetched_at = _end_fetched_at(coverage)
+    if last_session is None:
+        return True
+    # A fetch on a later UTC day than the session is always after its close, which spares the schedule lookup
+    if datetime.fromtimestamp(fetched_at, timezone.utc).date() > last_session:
+        return True
+    return fetched_at >= trading_calendar.session_close(last_session)
+
+
+def _missing_ranges(coverage, start, end, today):
+    # Date ranges (start, end), either end None for open-ended, that the stored bars don't cover
+    if coverage is None:
+        return [(start, end)]
+
+    missing = []
+    covered_start = _to_date(coverage["start"])
+    covered_end = _to_date(coverage["end"])
+    if covered_start is not None and (start is None or start < covered_start):
+        missing.append((start, covered_start - timedelta(days=1)))
+
+    # The last stored session is refetched when it was fetched before its close: at most every refresh
+    # interval while the market is open, and once more as soon as it has closed
+    if not _is_end_complete(coverage):
+        last_session = _last_session(covered_end)
+        refresh_seconds = DAILY_REFRESH_SECONDS if coverage["interval"] == DAILY_INTERVAL else INTRADAY_REFRESH_SECONDS
+        has_closed = time.time() >= trading_calendar.session_close(last_session)
+        if (end is None or end >= last_session) and (has_closed or time.time() - _end_fetched_at(coverage) >= refresh_seconds):
+            missing.append((last_session, end))
+            return missing
+    if min(end or today, today) > covered_end:
+        missing.append((covered_end, end))
+    return missing
+
+
+def _merge(stored, fetched):
+    # Fetched bars replace stored bars with the same timestamp
+    prices = np.concatenate([fetched, stored])
+    _, first_indices = np.unique(prices['date'], return_index=True)
+    return prices[first_indices]
+
+
+def get_prices(symbol, interval, start=None, end=None):
+    # Bars for symbol from start to end (both inclusive, None for the full history / up to today) as a
+    # read-only view of a memory-mapped structured array sorted by date. Only ranges missing from the
+    # local store are requested from FMP.
+    start, end = _to_date(start), _to_date(end)
+    today = date.today()
+    prices_path, coverage_path = _paths(symbol, interval)
+
+    with _lock_for(symbol, interval):
+        coverage = None
+        if os.path.exists(prices_path) and os.path.exists(coverage_path):
+            with open(coverage_path) as file:
+                coverage = json.load(file)
+
+        missing = _missing_ranges(coverage, start, end, today)
+        metrics.increment("price_store_lookups", interval=interval, result="miss" if missing else "hit")
+        if missing:
+            prices = np.load(prices_path) if coverage else np.empty(0, dtype=PRICE_DTYPE)
+            for missing_start, missing_end in missing:
+                prices = _merge(prices, fetch_prices(symbol, interval, missing_start, missing_end))
+
+            covered_start = None if start is None else start
+            covered_end = min(end or today, today)
+            end_fetched_at = time.time()
+            if coverage:
+                old_start = _to_date(coverage["start"])
+                covered_start = None if covered_start is None or old_start is None else min(covered_start, old_start)
+                covered_end = max(covered_end, _to_date(coverage["end"]))
+                # Only a fetch reaching the last stored session refreshes its bars
+                last_session = _last_session(_to_date(coverage["end"]))
+                if last_session and all(missing_end is not None and missing_end < last_session for _, missing_end in missing):
+                    end_fetched_at = _end_fetched_at(coverage)
+            _replace_atomically(prices_path, lambda file: np.save(file, prices))
+            _replace_atomically(coverage_path, lambda file: file.write(json.dumps({
+                "interval": interval,
+                "start": covered_start and covered_start.isoformat(),
+                "end": covered_end.isoformat(),
+                "fetched_at": time.time(),
+                "end_fetched_at": end_fetched_at,
+            }).encode()))
+
+        # An empty array has no data to map, and numpy refuses to mmap zero bytes
+        prices = np.load(prices_path, mmap_mode='r' if os.path.getsize(prices_path) > 128 else None)
+
+    first = 0 if start is None else np.searchsorted(prices['date'], np.datetime64(start, 's'), side='left')
+    last = len(prices) if end is None else np.searchsorted(prices['date'], np.datetime64(end + timedelta(days=1), 's'), side='left')
+    return prices[first:last]
@@ -0,0 +1,129 @@
+import heapq
+import logging
+
+from utils import metrics
+from utils.fetch_engine import fetch_stream
+from utils.fmp_client import FMPError, fmp_get_first, fmp_get_list
+from utils.ratings import average_recommendation_rating
+
+logger = logging.getLogger(__name__)
+
+NASDAQ_100 = "nasdaq100"
+SP_500 = "sp500"
+US_STOCKS = "us_stocks"
+# Each universe's constituent list as (path, params); add an entry here to rank another universe
+UNIVERSE_ENDPOINTS = {
+    NASDAQ_100: ("api/v3/nasdaq_constituent", None),
+    SP_500: ("api/v3/sp500_constituent", None),
+    US_STOCKS: ("api/v3/stock-screener", {
+        "country": "US",
+        "exchange": "NYSE,NASDAQ,AMEX",
+        "isEtf": "false",
+        "isFund": "false",
+        "isActivelyTrading": "true",
+        "marketCapMoreThan": 300_000_000,  # leaves out micro caps
+        "limit": 10_000,
+    }),
+}
+UNIVERSE_LABELS = {
+    NASDAQ_100: "NASDAQ-100",
+    SP_500: "S&P 500",
+    US_STOCKS: "All US stocks",
+}
+# GOOG is skipped in favor of GOOGL since GOOGL provides voting rights for shareholders
+EXCLUDED_SYMBOLS = {"GOOG"}
+TOP_N = 10
+
+# Every FMP record a symbol's score depends on, as (path, params) for the symbol
+INPUT_REQUESTS = {
+    "rating": lambda symbol: (f"api/v3/rating/{symbol}", None),
+    "analyst_ratings": lambda symbol: (f"api/v3/analyst-stock-recommendations/{symbol}", None),
+    "income_statement": lambda symbol: ("stable/income-statement", {"symbol": symbol}),
+}
+
+
+def fetch_constituents(universe=NASDAQ_100):
+    # Maps each constituent's symbol to its company name
+    path, params = UNIVERSE_ENDPOINTS[universe]
+    return {constituent['symbol']: constituent.get('name') or constituent.get('companyName', '')
+            for constituent in fmp_get_list(path, params)
+            if constituent['symbol'] not in EXCLUDED_SYMBOLS}
+
+
+def fetch_symbol_inputs(symbol):
+    # A failed input is simply absent, so the caller can tell a partial fetch from a complete one
+    inputs = {}
+    for name, request in INPUT_REQUESTS.items():
+        path, params = request(symbol)
+        try:
+            inputs[name] = fmp_get_first(path, params)
+        except FMPError as e:
+            metrics.increment("ranking_input_errors", input=name)
+            logger.warning("Error fetching %s for %s: %s", name, symbol, e)
+    return inputs
+
+
+def stream_inputs(symbols, max_in_flight=None):
+    # Yields (symbol, inputs) as each symbol's inputs arrive, with a bounded number of symbols in flight
+    for symbol, inputs, error in fetch_stream(fetch_symbol_inputs, symbols, max_in_flight=max_in_flight):
+        if error is not None:
+            logger.error("Error fetching inputs for %s", symbol, exc_info=error)
+        yield symbol, inputs or {}
+
+
+def score(inputs):
+    # Returns (rating, net income) for one symbol's inputs, with None for whatever can't be computed
+    rating = None
+    if "rating" in inputs and "analyst_ratings" in inputs:
+        try:
+            rating = average_recommendation_rating(inputs["rating"], inputs["analyst_ratings"])
+        except (KeyError, TypeError, ZeroDivisionError):
+            pass
+    net_income = inputs.get("income_statement", {}).get('netIncome')
+    return rating, net_income
+
+
+def stream_scores(symbols, max_in_flight=None):
+    # Yields (symbol, rating, net_income) in the order the scores complete
+    for symbol, inputs in stream_inputs(symbols, max_in_flight):
+        rating, net_income = score(inputs)
+        yield symbol, rating, net_income
+
+
+def score_symbols(symbols):
+    symbol_rating = {}
+    net_incomes = {}
+    for symbol, rating, net_income in stream_scores(symbols):
+        # A symbol without a rating cannot be ranked; a missing net income only loses the tie-break
+        if rating is not None:
+            symbol_rating[symbol] = rating
+        if net_income is not None:
+            net_incomes[symbol] = net_income
+    return symbol_rating, net_incomes
+
+
+class RunningTopK:
+    # Keeps the best k symbols seen so far in a min-heap, so ranking a universe of any size holds
+    # only k entries. Ordered by rating first, then by net income for ties.
+    def __init__(self, k=TOP_N):
+        self.k = k
+        self._heap = []
+
+    def push(self, symbol, rating, net_income=None):
+        if rating is None:
+            return
+        entry = (rating, net_income or 0, symbol)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif entry > self._heap[0]:
+            heapq.heapreplace(self._heap, entry)
+
+    def ranked(self):
+        return [symbol for _, _, symbol in sorted(self._heap, reverse=True)]
+
+
+def top_ranked(symbol_rating, net_incomes, top_n=TOP_N):
+    top = RunningTopK(top_n)
+    for symbol, rating in symbol_rating.items():
+        top.push(symbol, rating, net_incomes.get(symbol))
+    return top.ranked()
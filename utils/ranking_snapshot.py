@@ -0,0 +1,113 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+from utils.ranking import INPUT_REQUESTS, NASDAQ_100, UNIVERSE_ENDPOINTS, fetch_constituents, score, stream_inputs
+from utils.response_cache import get_cache_dir
+
+DEFAULT_MAX_AGE_HOURS = 24
+# A snapshot the job hasn't checked for this long is too old to show; twice the refresh age allows for a late run
+DEFAULT_STALE_AFTER_HOURS = 2 * DEFAULT_MAX_AGE_HOURS
+LATEST_POINTER = "latest.json"
+
+
+def _snapshot_dir(universe):
+    directory = os.path.join(get_cache_dir(), "rankings", universe)
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def _write_json(path, data):
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "w") as file:
+        json.dump(data, file)
+    os.replace(temporary_path, path)
+
+
+def inputs_hash(inputs):
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+
+def load_latest_snapshot(universe=NASDAQ_100):
+    # Returns the newest snapshot, or None if the job has never run for this universe
+    directory = _snapshot_dir(universe)
+    try:
+        with open(os.path.join(directory, LATEST_POINTER)) as file:
+            version = json.load(file)["version"]
+        with open(os.path.join(directory, f"{version}.json")) as file:
+            return json.load(file)
+    except (FileNotFoundError, KeyError, ValueError):
+        return None
+
+
+def snapshot_age(snapshot):
+    # Seconds since the job last checked the snapshot, which is later than created_at when nothing changed
+    return time.time() - snapshot.get("checked_at", snapshot["created_at"])
+
+
+def snapshot_scores(snapshot):
+    # Splits a snapshot into the (symbol_rating, net_incomes) pair the ranking works on
+    symbol_rating = {symbol: entry["rating"] for symbol, entry in snapshot["symbols"].items() if entry["rating"] is not None}
+    net_incomes = {symbol: entry["net_income"] for symbol, entry in snapshot["symbols"].items() if entry["net_income"] is not None}
+    return symbol_rating, net_incomes
+
+
+def refresh_snapshot(universe=NASDAQ_100, max_age_hours=DEFAULT_MAX_AGE_HOURS, force=False):
+    # Rescores new constituents and those last refreshed more than max_age_hours ago, carries the rest
+    # over, and writes a new version only when a constituent or a score input actually changed
+    previous = load_latest_snapshot(universe) or {"symbols": {}, "constituents": {}}
+    constituents = fetch_constituents(universe)
+    now = time.time()
+
+    stale_symbols = [symbol for symbol in constituents
+                     if force or symbol not in previous["symbols"]
+                     or now - previous["symbols"][symbol]["refreshed_at"] >= max_age_hours * 3600]
+
+    symbols = {symbol: previous["symbols"].get(symbol) for symbol in constituents}
+    changed_symbols = []
+    # Inputs are scored as they stream in and then dropped, so the job's memory doesn't grow with the universe
+    for symbol, inputs in stream_inputs(stale_symbols):
+        entry = symbols[symbol]
+        if len(inputs) < len(INPUT_REQUESTS) and entry is not None:
+            # A symbol whose fetch partly failed keeps its previous score and is retried on the next run
+            continue
+        digest = inputs_hash(inputs)
+        if entry is None or entry["inputs_hash"] != digest:
+            rating, net_income = score(inputs)
+            entry = {"rating": rating, "net_income": net_income, "inputs_hash": digest}
+            changed_symbols.append(symbol)
+        symbols[symbol] = dict(entry, refreshed_at=now)
+
+    directory = _snapshot_dir(universe)
+    # The first run always writes a version, even for an empty universe
+    if changed_symbols or constituents != previous["constituents"] or "version" not in previous:
+        version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        snapshot = {"version": version, "universe": universe, "created_at": now, "checked_at": now,
+                    "constituents": constituents, "symbols": symbols}
+        _write_json(os.path.join(directory, f"{version}.json"), snapshot)
+        _write_json(os.path.join(directory, LATEST_POINTER), {"version": version})
+    else:
+        # Nothing changed: keep the current version, but record that its symbols were just checked
+        snapshot = dict(previous, symbols=symbols, checked_at=now)
+        _write_json(os.path.join(directory, f"{previous['version']}.json"), snapshot)
+    return snapshot, stale_symbols, changed_symbols
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute the stock recommender's ranking snapshot.")
+    parser.add_argument("--universe", choices=sorted(UNIVERSE_ENDPOINTS), default=NASDAQ_100)
+    parser.add_argument("--max-age-hours", type=float, default=DEFAULT_MAX_AGE_HOURS,
+                        help="rescore symbols whose inputs were last fetched longer ago than this")
+    parser.add_argument("--force", action="store_true", help="rescore every symbol")
+    args = parser.parse_args()
+
+    snapshot, refreshed_symbols, changed_symbols = refresh_snapshot(args.universe, args.max_age_hours, args.force)
+    print(f"{args.universe}: refreshed {len(refreshed_symbols)} of {len(snapshot['constituents'])} symbols, "
+          f"{len(changed_symbols)} changed; latest version {snapshot['version']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+from statistics import mean
+
+STRONG_BUY_SCORE = 5
+BUY_SCORE = 4
+HOLD_SCORE = 3
+SELL_SCORE = 2
+STRONG_SELL_SCORE = 1
+
+
+def average_analyst_rating(analysts_ratings):
+    total_score = 0
+    total_score = total_score + STRONG_BUY_SCORE * analysts_ratings['analystRatingsStrongBuy']
+    total_score = total_score + BUY_SCORE * analysts_ratings['analystRatingsbuy']
+    total_score = total_score + HOLD_SCORE * analysts_ratings['analystRatingsHold']
+    total_score = total_score + SELL_SCORE * analysts_ratings['analystRatingsSell']
+    total_score = total_score + STRONG_SELL_SCORE * analysts_ratings['analystRatingsStrongSell']
+    total_analysts = analysts_ratings['analystRatingsStrongBuy'] + analysts_ratings['analystRatingsbuy'] + analysts_ratings['analystRatingsHold'] + analysts_ratings['analystRatingsSell'] + analysts_ratings['analystRatingsStrongSell']
+    average_analyst_rating = total_score / total_analysts
+    return average_analyst_rating
+
+
+def average_recommendation_rating(data, analysts_ratings):
+    all_rating_scores = list()
+    all_rating_scores.append(data["ratingScore"])
+    all_rating_scores.append(data["ratingDetailsDCFScore"])  # Discounted Cash Flow
+    all_rating_scores.append(data["ratingDetailsROEScore"])  # Return on Equity
+    all_rating_scores.append(data["ratingDetailsROAScore"])  # Return on Assets 
+    all_rating_scores.append(data["ratingDetailsDEScore"])  # Debt to Equity 
+    all_rating_scores.append(data["ratingDetailsPEScore"])  # Price to Earnings
+    all_rating_scores.append(data["ratingDetailsPBScore"])  # Price to Book
+    all_rating_scores.append(average_analyst_rating(analysts_ratings))
+    
+    return round(mean(all_rating_scores), 2)
@@ -0,0 +1,188 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import date
+
+from utils.shared_functions import get_setting, is_setting_enabled
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MAX_CACHE_BYTES = 256 * 1024 * 1024
+EVICTION_TARGET_RATIO = 0.9
+BUSY_TIMEOUT_SECONDS = 30
+# A hit only rewrites last_access when it is older than this, so most reads stay read-only
+ACCESS_UPDATE_INTERVAL = 5 * 60
+
+ONE_MINUTE = 60
+ONE_HOUR = 60 * ONE_MINUTE
+ONE_DAY = 24 * ONE_HOUR
+
+INTRADAY_TTL = 5 * ONE_MINUTE
+NEWS_TTL = 15 * ONE_MINUTE
+FUNDAMENTALS_TTL = ONE_DAY
+DEFAULT_TTL = ONE_HOUR
+
+PRICE_ENDPOINTS = {"historical-chart", "historical-price-full"}
+FUNDAMENTAL_ENDPOINTS = {
+    "profile",
+    "income-statement",
+    "key-metrics",
+    "discounted-cash-flow",
+    "rating",
+    "analyst-stock-recommendations",
+    "nasdaq_constituent",
+    "sp500_constituent",
+    "stock-screener",
+}
+
+_local = threading.local()
+# Database files whose schema this process has already created
+_schema_paths = set()
+_schema_lock = threading.Lock()
+
+
+def get_cache_dir():
+    cache_dir = get_setting("cache_dir", os.path.join(PROJECT_ROOT, ".cache"))
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def _create_schema(connection):
+    # One transaction, so a process creating the schema can't race another one writing rows
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                expires_at REAL,
+                last_access REAL NOT NULL,
+                size INTEGER NOT NULL
+            )
+        """)
+        connection.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        # The total size is kept up to date by triggers, so checking the budget is a one-row read
+        connection.execute("CREATE TABLE IF NOT EXISTS cache_size (id INTEGER PRIMARY KEY CHECK (id = 1), total INTEGER NOT NULL)")
+        connection.execute("INSERT OR IGNORE INTO cache_size (id, total) SELECT 1, COALESCE(SUM(size), 0) FROM responses")
+        connection.execute("""
+            CREATE TRIGGER IF NOT EXISTS responses_size_insert AFTER INSERT ON responses
+            BEGIN UPDATE cache_size SET total = total + new.size WHERE id = 1; END
+        """)
+        connection.execute("""
+            CREATE TRIGGER IF NOT EXISTS responses_size_delete AFTER DELETE ON responses
+            BEGIN UPDATE cache_size SET total = total - old.size WHERE id = 1; END
+        """)
+        connection.execute("""
+            CREATE TRIGGER IF NOT EXISTS responses_size_update AFTER UPDATE OF size ON responses
+            BEGIN UPDATE cache_size SET total = total + new.size - old.size WHERE id = 1; END
+        """)
+        connection.execute("COMMIT")
+    except Exception:
+        connection.execute("ROLLBACK")
+        raise
+
+
+def _connect():
+    # sqlite connections cannot be shared between threads, so each thread keeps its own.
+    # WAL lets every Streamlit worker process read while one of them writes.
+    connection = getattr(_local, "connection", None)
+    if connection is None:
+        path = os.path.join(get_cache_dir(), "fmp_responses.sqlite3")
+        connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        # The schema is created by the first connection in the process; later threads only set the pragmas
+        with _schema_lock:
+            if path not in _schema_paths:
+                _create_schema(connection)
+                _schema_paths.add(path)
+        _local.connection = connection
+    return connection
+
+
+def is_enabled():
+    return is_setting_enabled("fmp_cache_enabled")
+
+
+def make_key(path, params=None):
+    query = "&".join(f"{name}={value}" for name, value in sorted((params or {}).items()) if name != "apikey")
+    return f"{path.strip('/')}?{query}"
+
+
+def ttl_for(endpoint, path, params=None):
+    # Returns the time to live in seconds, or None for responses that never change
+    params = params or {}
+    if endpoint in PRICE_ENDPOINTS:
+        end = params.get("to")
+        if end is not None and str(end) < date.today().isoformat():
+            return None  # bars of closed sessions are immutable
+        parts = path.strip("/").split("/")
+        interval = parts[parts.index(endpoint) + 1] if endpoint == "historical-chart" else "1day"
+        return 3 * INTRADAY_TTL if interval == "1day" else INTRADAY_TTL
+    if endpoint == "stock_news":
+        return NEWS_TTL
+    if endpoint == "quote":
+        return INTRADAY_TTL
+    if endpoint in FUNDAMENTAL_ENDPOINTS:
+        return FUNDAMENTALS_TTL
+    return DEFAULT_TTL
+
+
+def get(key):
+    now = time.time()
+    connection = _connect()
+    row = connection.execute("SELECT body, expires_at, last_access FROM responses WHERE key = ?", (key,)).fetchone()
+    if row is None:
+        return None
+    body, expires_at, last_access = row
+    if expires_at is not None and expires_at <= now:
+        connection.execute("DELETE FROM responses WHERE key = ? AND expires_at <= ?", (key, now))
+        return None
+    if now - last_access >= ACCESS_UPDATE_INTERVAL:
+        connection.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+    return body
+
+
+def put(key, body, ttl):
+    now = time.time()
+    expires_at = None if ttl is None else now + ttl
+    connection = _connect()
+    # An upsert rather than INSERT OR REPLACE, whose implicit delete would skip the size trigger
+    connection.execute(
+        "INSERT INTO responses (key, body, expires_at, last_access, size) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT (key) DO UPDATE SET body = excluded.body, expires_at = excluded.expires_at, "
+        "last_access = excluded.last_access, size = excluded.size",
+        (key, sqlite3.Binary(body), expires_at, now, len(body))
+    )
+    evict(connection)
+
+
+def _total_size(connection):
+    return connection.execute("SELECT total FROM cache_size WHERE id = 1").fetchone()[0]
+
+
+def evict(connection=None):
+    # Drops expired rows, then least recently used rows until the cache is back under its size budget
+    connection = connection or _connect()
+    max_bytes = int(get_setting("fmp_cache_max_bytes", DEFAULT_MAX_CACHE_BYTES))
+    if _total_size(connection) <= max_bytes:
+        return
+
+    connection.execute("DELETE FROM responses WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+    target = max_bytes * EVICTION_TARGET_RATIO
+    total = _total_size(connection)
+    if total <= target:
+        return
+
+    rows = connection.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall()
+    stale_keys = []
+    for key, size in rows:
+        if total <= target:
+            break
+        stale_keys.append((key,))
+        total -= size
+    connection.executemany("DELETE FROM responses WHERE key = ?", stale_keys)
+
+
+def clear():
+    _connect().execute("DELETE FROM responses")
@@ -0,0 +1,86 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+
+DEFAULT_CHUNK_SIZE = 10_000
+PERCENTILES = (5, 25, 50, 75, 95)
+# Annual returns are floored just above a total loss so growth factors stay positive
+MIN_ANNUAL_RETURN = -0.99
+
+
+class MonteCarloResult(NamedTuple):
+    success_probability: float  # share of paths whose savings outlast the retirement
+    percentiles: tuple  # the percentiles reported in balance_bands
+    balance_bands: np.ndarray  # len(percentiles) x (years_in_retirement + 1) balances in today's dollars
+    final_real_balances: np.ndarray  # balance left at the end of each path, in today's dollars
+
+
+def retirement_target_grid(annual_expenses, years_until_retirement, inflation_rates, multiples):
+    # Savings target at retirement for every combination of the inputs in one broadcast:
+    # expenses * multiple * (1 + inflation) ** years, shaped (expenses, years, inflation rates, multiples)
+    expenses, years, inflation, multiples = np.ix_(
+        np.asarray(annual_expenses, dtype=float),
+        np.asarray(years_until_retirement, dtype=float),
+        np.asarray(inflation_rates, dtype=float),
+        np.asarray(multiples, dtype=float),
+    )
+    return expenses * multiples * (1 + inflation) ** years
+
+
+def _simulate_chunk(seed_sequence, num_of_paths, years_until_retirement, years_in_retirement, starting_balance,
+                    annual_expenses, return_mean, return_volatility, inflation_mean, inflation_volatility):
+    rng = np.random.default_rng(seed_sequence)
+    total_years = years_until_retirement + years_in_retirement
+    inflation = rng.normal(inflation_mean, inflation_volatility, (num_of_paths, total_years))
+    returns = rng.normal(return_mean, return_volatility, (num_of_paths, years_in_retirement))
+    np.maximum(returns, MIN_ANNUAL_RETURN, out=returns)
+
+    # price_level[:, t] is the price level at the start of year t relative to today
+    price_level = np.ones((num_of_paths, total_years + 1))
+    np.cumprod(1 + inflation, axis=1, out=price_level[:, 1:])
+    retirement_price_level = price_level[:, years_until_retirement:]
+
+    # Each retirement year starts with a withdrawal of that year's inflated expenses, then the rest
+    # grows by the year's return: B[k + 1] = (B[k] - W[k]) * (1 + r[k]). With G[k] the growth before
+    # year k this unrolls to B[k] = G[k] * (B[0] - sum(W[j] / G[j] for j < k)), one cumulative sum.
+    growth = np.ones((num_of_paths, years_in_retirement + 1))
+    np.cumprod(1 + returns, axis=1, out=growth[:, 1:])
+    withdrawals = annual_expenses * retirement_price_level[:, :-1]
+    discounted_withdrawals = np.cumsum(withdrawals / growth[:, :-1], axis=1)
+
+    remaining = np.empty_like(growth)
+    remaining[:, 0] = starting_balance
+    np.subtract(starting_balance, discounted_withdrawals, out=remaining[:, 1:])
+    balances = np.maximum(remaining, 0) * growth
+    return balances / retirement_price_level, remaining[:, -1] >= 0
+
+
+def simulate_retirement(years_until_retirement, years_in_retirement, starting_balance, annual_expenses,
+                        return_mean, return_volatility, inflation_mean, inflation_volatility,
+                        num_of_paths=50_000, seed=None, chunk_size=DEFAULT_CHUNK_SIZE, workers=None):
+    # Simulates num_of_paths independent inflation and return paths. Chunks get their own child
+    # seeds, so a seed reproduces the same result regardless of the number of workers.
+    years_until_retirement = int(round(years_until_retirement))
+    years_in_retirement = int(round(years_in_retirement))
+    if years_in_retirement < 1:
+        raise ValueError("The retirement must last at least one year")
+
+    chunk_sizes = [min(chunk_size, num_of_paths - start) for start in range(0, num_of_paths, chunk_size)]
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+    parameters = (years_until_retirement, years_in_retirement, starting_balance, annual_expenses,
+                  return_mean, return_volatility, inflation_mean, inflation_volatility)
+
+    # NumPy releases the GIL inside its array kernels, so chunks run in parallel on threads
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        chunks = list(executor.map(lambda job: _simulate_chunk(*job, *parameters), zip(seed_sequences, chunk_sizes)))
+
+    real_balances = np.concatenate([balances for balances, _ in chunks])
+    succeeded = np.concatenate([success for _, success in chunks])
+    return MonteCarloResult(
+        success_probability=float(succeeded.mean()),
+        percentiles=PERCENTILES,
+        balance_bands=np.percentile(real_balances, PERCENTILES, axis=0),
+        final_real_balances=real_balances[:, -1],
+    )
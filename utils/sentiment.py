@@ -0,0 +1,334 @@
+import json
+import logging
+import os
+import threading
+
+from utils import metrics
+from utils.response_cache import get_cache_dir
+from utils.shared_functions import get_setting, is_setting_enabled
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "yiyanghkust/finbert-tone"
+MAX_SENTIMENT_TOKENS = 512
+DEFAULT_SENTIMENT_BATCH_SIZE = 16
+
+# Inference backends, selected with the sentiment_backend setting
+TORCH_BACKEND = "torch"  # fp32 PyTorch
+INT8_BACKEND = "int8"  # PyTorch with dynamically quantized int8 Linear layers
+ONNX_BACKEND = "onnx"  # ONNX Runtime graph exported from the fp32 model
+BACKENDS = (TORCH_BACKEND, INT8_BACKEND, ONNX_BACKEND)
+
+ONNX_INPUT_NAMES = ("input_ids", "attention_mask", "token_type_ids")
+ONNX_OPSET_VERSION = 17
+PARITY_TOLERANCE = 0.05
+PARITY_SAMPLE_TEXTS = [
+    "Shares jumped after the company reported record quarterly revenue and raised its full-year outlook.",
+    "The stock fell sharply after the firm missed earnings estimates and cut guidance.",
+    "The company will hold its annual shareholder meeting on Thursday.",
+    "Regulators opened an investigation into the bank's lending practices.",
+]
+
+# Model readiness states
+NOT_LOADED = "not loaded"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+_state = NOT_LOADED
+_tokenizer = None
+_finbert = None  # the fp32 model, only kept in memory by the torch backend
+_scorers = {}
+_load_lock = threading.Lock()
+_scorer_lock = threading.Lock()
+
+
+def is_service_enabled():
+    return is_setting_enabled("sentiment_service", default=False)
+
+
+def get_model_state():
+    if is_service_enabled():
+        from utils import sentiment_service
+        return sentiment_service.get_state()
+    return _state
+
+
+def load_tokenizer():
+    # transformers is imported here rather than at module level so that pages which never score
+    # sentiment don't pay for it. The lock makes concurrent first callers share one load.
+    global _tokenizer
+    with _load_lock:
+        if _tokenizer is None:
+            from transformers import BertTokenizer
+            _tokenizer = BertTokenizer.from_pretrained(MODEL_NAME)
+    return _tokenizer
+
+
+def _load_fp32_model():
+    from transformers import BertForSequenceClassification
+    model = BertForSequenceClassification.from_pretrained(MODEL_NAME)
+    model.eval()
+    return model
+
+
+def load_finbert_model():
+    global _finbert
+    tokenizer = load_tokenizer()
+    with _load_lock:
+        if _finbert is None:
+            _finbert = _load_fp32_model()
+    return tokenizer, _finbert
+
+
+def _warm_up():
+    try:
+        get_scorer()
+    except Exception as e:
+        logger.warning("Error warming up FinBERT: %s", e)
+
+
+def warm_up():
+    # Starts loading the model on a daemon thread; returns None when there is nothing to do
+    if is_service_enabled():
+        from utils import sentiment_service
+        sentiment_service.get_service()  # the worker process loads the model as it starts
+        return None
+    if _state in (LOADING, READY):
+        return None
+    thread = threading.Thread(target=_warm_up, name="finbert-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def get_backend():
+    backend = get_setting("sentiment_backend", TORCH_BACKEND)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown sentiment backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+    return backend
+
+
+def get_inference_threads():
+    threads = get_setting("sentiment_threads")
+    return int(threads) if threads else None
+
+
+def _softmax_rows(logits):
+    import numpy as np
+
+    exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return (exp / exp.sum(axis=1, keepdims=True)).tolist()
+
+
+def _build_torch_scorer(model):
+    import torch
+
+    def score(batch):
+        with torch.no_grad():
+            logits = model(**{name: torch.from_numpy(values) for name, values in batch.items()}).logits
+        return _softmax_rows(logits.numpy())
+    return score
+
+
+def _parity_path(backend):
+    return os.path.join(get_cache_dir(), f"{MODEL_NAME.replace('/', '--')}.{backend}.parity.json")
+
+
+def _read_parity(backend):
+    try:
+        with open(_parity_path(backend)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_parity(backend, parity):
+    with open(_parity_path(backend), "w") as file:
+        json.dump(parity, file)
+
+
+def _reference_scores(model):
+    # fp32 scores of the parity sample, taken before the model is converted; None when the check is off
+    if not is_setting_enabled("sentiment_parity_check"):
+        return None
+    return _score_texts(PARITY_SAMPLE_TEXTS, _build_torch_scorer(model))
+
+
+def _check_parity(backend, scorer, reference_scores):
+    if reference_scores is None:
+        return None
+    parity = compare_scores(_score_texts(PARITY_SAMPLE_TEXTS, scorer), reference_scores)
+    _write_parity(backend, parity)
+    return parity
+
+
+def _build_int8_scorer():
+    # Quantizing in place replaces the fp32 Linear layers, so only the int8 weights stay in memory.
+    # The parity check runs the first time the model is quantized; later starts reuse its stored result.
+    import torch
+
+    model = _load_fp32_model()
+    reference_scores = _reference_scores(model) if _read_parity(INT8_BACKEND) is None else None
+    torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    scorer = _build_torch_scorer(model)
+    return scorer, _check_parity(INT8_BACKEND, scorer, reference_scores)
+
+
+def _export_onnx(tokenizer, model, path):
+    import torch
+
+    sample = tokenizer(PARITY_SAMPLE_TEXTS[:2], padding=True, return_tensors="pt")
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in ONNX_INPUT_NAMES}
+    dynamic_axes["logits"] = {0: "batch"}
+    # Export next to the final path and rename, so other processes never see a half-written graph
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    torch.onnx.export(
+        model,
+        tuple(sample[name] for name in ONNX_INPUT_NAMES),
+        temporary_path,
+        input_names=list(ONNX_INPUT_NAMES),
+        output_names=["logits"],
+        dynamic_axes=dynamic_axes,
+        opset_version=ONNX_OPSET_VERSION
+    )
+    os.replace(temporary_path, path)
+
+
+def _build_onnx_scorer():
+    # Once the graph is exported only the tokenizer and the ONNX Runtime session are loaded; torch and
+    # the fp32 model are needed for the export and its parity check alone
+    import onnxruntime
+
+    path = os.path.join(get_cache_dir(), f"{MODEL_NAME.replace('/', '--')}.onnx")
+    reference_scores = None
+    if not os.path.exists(path):
+        model = _load_fp32_model()
+        _export_onnx(load_tokenizer(), model, path)
+        reference_scores = _reference_scores(model)
+        del model
+
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    threads = get_inference_threads()
+    if threads:
+        options.intra_op_num_threads = threads
+    session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+    def score(batch):
+        logits = session.run(["logits"], {name: batch[name] for name in ONNX_INPUT_NAMES})[0]
+        return _softmax_rows(logits)
+    return score, _check_parity(ONNX_BACKEND, score, reference_scores)
+
+
+def _set_torch_threads():
+    import torch
+
+    threads = get_inference_threads()
+    if threads:
+        torch.set_num_threads(threads)
+
+
+def _build_scorer(backend):
+    # A reduced-precision backend is only built when it hasn't failed the parity check already
+    if backend == TORCH_BACKEND:
+        _set_torch_threads()
+        return _build_torch_scorer(load_finbert_model()[1])
+
+    parity = _read_parity(backend)
+    if parity is None or parity["passed"]:
+        if backend == ONNX_BACKEND:
+            scorer, checked_parity = _build_onnx_scorer()
+        else:
+            _set_torch_threads()
+            scorer, checked_parity = _build_int8_scorer()
+        parity = checked_parity or parity
+    if parity is not None and not parity["passed"]:
+        logger.warning("Sentiment backend %s failed the fp32 parity check (%s); using fp32", backend, parity)
+        return _build_scorer(TORCH_BACKEND)
+    return scorer
+
+
+def get_scorer(backend=None):
+    # Returns a function mapping a padded batch of numpy token arrays to probability rows.
+    # A reduced-precision backend that failed the parity check against fp32 falls back to fp32.
+    global _state
+    backend = backend or get_backend()
+    with _scorer_lock:
+        if backend not in _scorers:
+            _state = LOADING
+            try:
+                _scorers[backend] = _build_scorer(backend)
+            except Exception:
+                _state = FAILED
+                raise
+            _state = READY
+    return _scorers[backend]
+
+
+def compare_scores(scores, reference_scores, tolerance=PARITY_TOLERANCE):
+    # Compares a backend's compound scores with the fp32 model's on the same texts
+    differences = [abs(score - reference) for score, reference in zip(scores, reference_scores)]
+    same_label = [(score > 0) - (score < 0) == (reference > 0) - (reference < 0)
+                  for score, reference in zip(scores, reference_scores)]
+    max_difference = max(differences, default=0.0)
+    return {
+        "max_abs_difference": max_difference,
+        "label_agreement": sum(same_label) / len(same_label) if same_label else 1.0,
+        "passed": max_difference <= tolerance and all(same_label),
+    }
+
+
+def compound_sentiment(probs):
+    sentiment_idx = probs.index(max(probs))
+    if sentiment_idx == 0:  # negative
+        compound = -probs[0]
+    elif sentiment_idx == 2:  # positive
+        compound = probs[2]
+    else:  # neutral
+        compound = 0.0
+    return compound
+
+
+def _score_texts(texts, scorer, batch_size=DEFAULT_SENTIMENT_BATCH_SIZE):
+    tokenizer = load_tokenizer()
+
+    # Tokenize everything once without padding, then batch texts of similar length together
+    # so each batch is only padded to its own longest text
+    with metrics.span("sentiment_tokenize"):
+        encodings = tokenizer(texts, truncation=True, max_length=MAX_SENTIMENT_TOKENS)
+    order = sorted(range(len(texts)), key=lambda i: len(encodings["input_ids"][i]))
+
+    scores = [0.0] * len(texts)
+    for start in range(0, len(order), batch_size):
+        batch_indices = order[start:start + batch_size]
+        with metrics.span("sentiment_tokenize"):
+            batch = tokenizer.pad(
+                {name: [values[i] for i in batch_indices] for name, values in encodings.items()},
+                padding=True,
+                return_tensors="np"
+            )
+            batch = {name: values.astype("int64") for name, values in batch.items()}
+        with metrics.span("sentiment_inference", batch_size=len(batch_indices)):
+            probabilities = scorer(batch)
+        for i, probs in zip(batch_indices, probabilities):
+            scores[i] = compound_sentiment(probs)
+    metrics.increment("sentiment_texts_scored", len(texts))
+    return scores
+
+
+def analyze_sentiments(texts, batch_size=None):
+    if not texts:
+        return []
+    if is_service_enabled():
+        # The shared worker process batches these texts with other sessions' requests
+        from utils import sentiment_service
+        with metrics.span("sentiment_service_wait", texts=len(texts)):
+            scores = sentiment_service.submit(texts).result(timeout=sentiment_service.get_result_timeout())
+        metrics.increment("sentiment_texts_scored", len(texts))
+        return scores
+    batch_size = int(batch_size or get_setting("sentiment_batch_size", DEFAULT_SENTIMENT_BATCH_SIZE))
+    return _score_texts(texts, get_scorer(), batch_size)
+
+
+def analyze_sentiment(text):
+    return analyze_sentiments([text])[0]
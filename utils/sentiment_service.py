@@ -0,0 +1,180 @@
+import itertools
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from utils import sentiment
+from utils.shared_functions import get_setting
+
+logger = logging.getLogger(__name__)
+
+# Texts scored together in one micro-batch, and how long the first request of a batch waits for company
+DEFAULT_MAX_BATCH_TEXTS = 64
+DEFAULT_MAX_WAIT_MS = 20
+# Seconds a caller waits for its scores, which covers loading the model on a cold start
+DEFAULT_RESULT_TIMEOUT = 180
+# How often the result reader checks that the worker is still alive
+WORKER_POLL_SECONDS = 1.0
+
+_READY_MESSAGE = "ready"
+_FAILED_MESSAGE = "failed"
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def _collect_batch(requests, first, max_batch_texts, max_wait):
+    # Takes requests until the batch holds max_batch_texts texts or max_wait has passed since the first
+    # one arrived. Returns the batch and whether the stop sentinel was seen.
+    batch = [first]
+    text_count = len(first[1])
+    deadline = time.monotonic() + max_wait
+    while text_count < max_batch_texts:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            request = requests.get(timeout=remaining)
+        except queue.Empty:
+            break
+        if request is None:
+            return batch, True
+        batch.append(request)
+        text_count += len(request[1])
+    return batch, False
+
+
+def _worker_main(requests, results, max_batch_texts, max_wait):
+    # Runs in the worker process: loads the model once, then scores micro-batches of requests
+    # from every session. Each request is (request_id, texts); each result is (request_id, scores, error).
+    try:
+        scorer = sentiment.get_scorer()
+    except Exception as e:
+        results.put((_FAILED_MESSAGE, None, f"{type(e).__name__}: {e}"))
+        return
+    results.put((_READY_MESSAGE, None, None))
+    batch_size = int(get_setting("sentiment_batch_size", sentiment.DEFAULT_SENTIMENT_BATCH_SIZE))
+
+    stopping = False
+    while not stopping:
+        first = requests.get()
+        if first is None:
+            break
+        batch, stopping = _collect_batch(requests, first, max_batch_texts, max_wait)
+        texts = [text for _, request_texts in batch for text in request_texts]
+        try:
+            scores = sentiment._score_texts(texts, scorer, batch_size)
+        except Exception as e:
+            for request_id, _ in batch:
+                results.put((request_id, None, f"{type(e).__name__}: {e}"))
+            continue
+        start = 0
+        for request_id, request_texts in batch:
+            results.put((request_id, scores[start:start + len(request_texts)], None))
+            start += len(request_texts)
+
+
+class SentimentService:
+    # Client side of the sentiment worker process, shared by every session of this Streamlit server.
+    # submit() queues texts and returns a Future; a reader thread resolves the futures as results come back.
+    def __init__(self, max_batch_texts=DEFAULT_MAX_BATCH_TEXTS, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        # spawn rather than fork, so the worker doesn't inherit the server's threads and locks
+        context = multiprocessing.get_context("spawn")
+        self._requests = context.Queue()
+        self._results = context.Queue()
+        self._process = context.Process(
+            target=_worker_main,
+            args=(self._requests, self._results, max_batch_texts, max_wait_ms / 1000),
+            name="sentiment-worker",
+            daemon=True
+        )
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._request_ids = itertools.count()
+        self.state = sentiment.LOADING
+        self.error = None
+        self.load_failed = False
+        self._process.start()
+        threading.Thread(target=self._read_results, name="sentiment-results", daemon=True).start()
+
+    def is_alive(self):
+        return self._process.is_alive()
+
+    def submit(self, texts):
+        # The state is checked under the same lock _fail_pending takes, so every registered future
+        # is either resolved by the reader or failed with the rest
+        future = Future()
+        with self._pending_lock:
+            if self.state == sentiment.FAILED:
+                future.set_exception(RuntimeError(f"Sentiment worker is unavailable: {self.error}"))
+                return future
+            request_id = next(self._request_ids)
+            self._pending[request_id] = future
+        self._requests.put((request_id, list(texts)))
+        return future
+
+    def _fail_pending(self, message):
+        with self._pending_lock:
+            self.state = sentiment.FAILED
+            self.error = message
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(RuntimeError(f"Sentiment worker is unavailable: {message}"))
+
+    def _read_results(self):
+        while True:
+            try:
+                request_id, scores, error = self._results.get(timeout=WORKER_POLL_SECONDS)
+            except queue.Empty:
+                if not self._process.is_alive():
+                    self._fail_pending(f"worker exited with code {self._process.exitcode}")
+                    return
+                continue
+            if request_id == _READY_MESSAGE:
+                self.state = sentiment.READY
+                continue
+            if request_id == _FAILED_MESSAGE:
+                logger.warning("Error loading FinBERT in the sentiment worker: %s", error)
+                self.load_failed = True
+                self._fail_pending(error)
+                return
+            with self._pending_lock:
+                future = self._pending.pop(request_id, None)
+            if future is None:
+                continue
+            if error is None:
+                future.set_result(scores)
+            else:
+                future.set_exception(RuntimeError(error))
+
+    def shutdown(self):
+        self._requests.put(None)
+        self._process.join(timeout=5)
+
+
+def get_service():
+    # Starts the worker on first use; a worker that crashed is replaced on the next call, one that
+    # could not load the model is not
+    global _service
+    with _service_lock:
+        if _service is None or (not _service.is_alive() and not _service.load_failed):
+            _service = SentimentService(
+                int(get_setting("sentiment_service_max_batch", DEFAULT_MAX_BATCH_TEXTS)),
+                float(get_setting("sentiment_service_max_wait_ms", DEFAULT_MAX_WAIT_MS))
+            )
+    return _service
+
+
+def get_state():
+    return _service.state if _service is not None else sentiment.NOT_LOADED
+
+
+def submit(texts):
+    return get_service().submit(texts)
+
+
+def get_result_timeout():
+    return float(get_setting("sentiment_service_timeout", DEFAULT_RESULT_TIMEOUT))
@@ -0,0 +1,93 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from utils.response_cache import BUSY_TIMEOUT_SECONDS, get_cache_dir
+
+_local = threading.local()
+
+
+def _connect():
+    connection = getattr(_local, "connection", None)
+    if connection is None:
+        connection = sqlite3.connect(os.path.join(get_cache_dir(), "sentiment.sqlite3"),
+                                     timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS articles (
+                symbol TEXT NOT NULL,
+                article_id TEXT NOT NULL,
+                published_date TEXT NOT NULL,
+                title TEXT NOT NULL,
+                url TEXT NOT NULL,
+                sentiment REAL NOT NULL,
+                PRIMARY KEY (symbol, article_id)
+            )
+        """)
+        connection.execute("CREATE INDEX IF NOT EXISTS articles_by_date ON articles (symbol, published_date)")
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS watermarks (
+                symbol TEXT PRIMARY KEY,
+                published_date TEXT,
+                checked_at REAL NOT NULL
+            )
+        """)
+        _local.connection = connection
+    return connection
+
+
+def article_id(article, content):
+    # Syndicated articles are republished under new URLs, so fall back to the text when there is no URL
+    key = article.get('url') or content
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def get_watermark(symbol):
+    # Returns (latest stored publishedDate, unix time of the last news fetch) or (None, None)
+    row = _connect().execute(
+        "SELECT published_date, checked_at FROM watermarks WHERE symbol = ?", (symbol,)
+    ).fetchone()
+    return row if row else (None, None)
+
+
+def known_article_ids(symbol, article_ids):
+    if not article_ids:
+        return set()
+    placeholders = ",".join("?" * len(article_ids))
+    rows = _connect().execute(
+        f"SELECT article_id FROM articles WHERE symbol = ? AND article_id IN ({placeholders})",
+        (symbol, *article_ids)
+    ).fetchall()
+    return {row[0] for row in rows}
+
+
+def add_articles(symbol, scored_articles):
+    # scored_articles: iterable of (article_id, published_date, title, url, sentiment)
+    scored_articles = list(scored_articles)
+    connection = _connect()
+    with connection:
+        connection.execute("BEGIN")
+        connection.executemany(
+            "INSERT OR IGNORE INTO articles (symbol, article_id, published_date, title, url, sentiment) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(symbol, *row) for row in scored_articles]
+        )
+        latest = connection.execute(
+            "SELECT MAX(published_date) FROM articles WHERE symbol = ?", (symbol,)
+        ).fetchone()[0]
+        connection.execute(
+            "INSERT OR REPLACE INTO watermarks (symbol, published_date, checked_at) VALUES (?, ?, ?)",
+            (symbol, latest, time.time())
+        )
+
+
+def latest_articles(symbol, limit):
+    rows = _connect().execute(
+        "SELECT title, url, sentiment, published_date FROM articles WHERE symbol = ? "
+        "ORDER BY published_date DESC LIMIT ?",
+        (symbol, limit)
+    ).fetchall()
+    return [{'title': title, 'url': url, 'sentiment': sentiment, 'published_date': published_date}
+            for title, url, sentiment, published_date in rows]
@@ -1,5 +1,5 @@
 import datetime
-import pandas_market_calendars as mcal
+import os
 import yfinance as yf
 from datetime import datetime, timedelta
 import pandas as pd
@@ -8,13 +8,33 @@ import streamlit as st
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
+from utils import trading_calendar
+
+
 def is_market_open(date):
-    nyse = mcal.get_calendar('NYSE')
-    schedule = nyse.schedule(start_date=date, end_date=date)
-    return not schedule.empty
+    return trading_calendar.is_market_open(date)
 
 
 def get_previous_market_day(date):
-    while not is_market_open(date):
-        date = date - timedelta(days=1)
-    return date
+    # Steps back by whole days so a datetime argument keeps its time of day
+    previous_session = trading_calendar.previous_session(date)
+    days_back = trading_calendar.to_day(date) - trading_calendar.to_day(previous_session)
+    return date - timedelta(days=int(days_back.astype(int)))
+
+
+def get_setting(name, default=None):
+    # Environment variables (upper-cased) take precedence over .streamlit/secrets.toml
+    value = os.environ.get(name.upper())
+    if value is not None:
+        return value
+    try:
+        return st.secrets.get(name, default)
+    except FileNotFoundError:
+        return default
+
+
+def is_setting_enabled(name, default=True):
+    value = get_setting(name, default)
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() not in ("0", "false", "no", "off")
@@ -0,0 +1,102 @@
+import functools
+import threading
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas_market_calendars as mcal
+
+CALENDAR_NAME = 'NYSE'
+INDEX_START_DATE = date(1980, 1, 1)
+INDEX_DAYS_AHEAD = 2 * 365
+# Dates outside the index are looked up in the exchange schedule, this many days either side of them
+OUTSIDE_INDEX_SEARCH_DAYS = 366
+
+_sessions = None
+_sessions_lock = threading.Lock()
+
+
+def get_sessions():
+    # Sorted datetime64[D] array of every NYSE session in the index range, built once per process
+    global _sessions
+    with _sessions_lock:
+        if _sessions is None:
+            end_date = date.today() + timedelta(days=INDEX_DAYS_AHEAD)
+            valid_days = mcal.get_calendar(CALENDAR_NAME).valid_days(start_date=INDEX_START_DATE, end_date=end_date)
+            _sessions = valid_days.tz_localize(None).values.astype('datetime64[D]')
+    return _sessions
+
+
+def to_day(value):
+    if isinstance(value, datetime):
+        value = value.date()
+    return np.datetime64(value, 'D')
+
+
+def _in_index(day):
+    sessions = get_sessions()
+    return sessions[0] <= day <= sessions[-1]
+
+
+@functools.lru_cache(maxsize=64)
+def _schedule_sessions(start, end):
+    # Sessions from start to end, both inclusive, read from the exchange schedule. Used for dates outside
+    # the index, so any date works at the cost of a slower lookup.
+    valid_days = mcal.get_calendar(CALENDAR_NAME).valid_days(start_date=str(start), end_date=str(end))
+    return valid_days.tz_localize(None).values.astype('datetime64[D]')
+
+
+def _sessions_around(day):
+    # The index when it covers day, otherwise the schedule's sessions within OUTSIDE_INDEX_SEARCH_DAYS of it
+    if _in_index(day):
+        return get_sessions()
+    search = np.timedelta64(OUTSIDE_INDEX_SEARCH_DAYS, 'D')
+    return _schedule_sessions(day - search, day + search)
+
+
+def is_market_open(value):
+    day = to_day(value)
+    sessions = _sessions_around(day)
+    i = np.searchsorted(sessions, day)
+    return i < len(sessions) and sessions[i] == day
+
+
+def previous_session(value, inclusive=True):
+    # Latest session on or before the date (strictly before it when inclusive is False)
+    day = to_day(value) - np.timedelta64(0 if inclusive else 1, 'D')
+    sessions = _sessions_around(day)
+    i = np.searchsorted(sessions, day, side='right') - 1
+    if i < 0:
+        raise ValueError(f"No session before {value} in the trading calendar")
+    return sessions[i].item()
+
+
+def next_session(value, inclusive=True):
+    # Earliest session on or after the date (strictly after it when inclusive is False)
+    day = to_day(value) + np.timedelta64(0 if inclusive else 1, 'D')
+    sessions = _sessions_around(day)
+    i = np.searchsorted(sessions, day, side='left')
+    if i >= len(sessions):
+        raise ValueError(f"No session after {value} in the trading calendar")
+    return sessions[i].item()
+
+
+@functools.lru_cache(maxsize=64)
+def session_close(day):
+    # POSIX timestamp of the market close of the session on day, early closes included
+    schedule = mcal.get_calendar(CALENDAR_NAME).schedule(start_date=day, end_date=day)
+    if schedule.empty:
+        raise ValueError(f"{day} is not a session")
+    return schedule["market_close"].iloc[0].timestamp()
+
+
+def sessions_in_range(start, end):
+    # Sessions from start to end, both inclusive, as a view into the index when it covers both dates
+    start, end = to_day(start), to_day(end)
+    if not (_in_index(start) and _in_index(end)):
+        return _schedule_sessions(start, end)
+    sessions = get_sessions()
+    return sessions[np.searchsorted(sessions, start, side='left'):np.searchsorted(sessions, end, side='right')]
+
+
+def count_sessions(start, end):
+    return len(sessions_in_range(start, end))
@@ -0,0 +1,106 @@
+import math
+
+import numpy as np
+
+DAYS_IN_A_YEAR = 365.0
+MAX_ITERATIONS = 100
+TOLERANCE = 1e-12
+# Solutions are searched for in log space, x = ln(1 + rate), between these bounds
+MAX_LOG_RATE = 10.0
+INITIAL_BRACKET = 1.0
+
+
+def _find_root(f, df, guess, low, high):
+    # Newton's method safeguarded by a sign-changing bracket: whenever a Newton step would leave
+    # the bracket (or the derivative vanishes) the step is replaced by bisection
+    f_low = f(low)
+    if f_low == 0:
+        return low
+    x = min(max(guess, low), high)
+    for _ in range(MAX_ITERATIONS):
+        fx = f(x)
+        if fx == 0:
+            return x
+        if (fx < 0) == (f_low < 0):
+            low, f_low = x, fx
+        else:
+            high = x
+
+        dfx = df(x)
+        next_x = x - fx / dfx if dfx else low
+        if not low < next_x < high:
+            next_x = (low + high) / 2
+        if abs(next_x - x) <= TOLERANCE * max(1.0, abs(x)):
+            return next_x
+        x = next_x
+    return x
+
+
+def _bracket(f):
+    # Widens [-b, b] until f changes sign; returns None when it never does
+    bound = INITIAL_BRACKET
+    while bound <= MAX_LOG_RATE:
+        if (f(-bound) < 0) != (f(bound) < 0):
+            return -bound, bound
+        bound *= 2
+    return None
+
+
+def xirr(amounts, dates, guess=0.1):
+    # Annual rate r with sum(amount / (1 + r) ** (days since first flow / 365)) == 0, or nan when the
+    # cash flows don't change sign. Outflows are negative and inflows positive.
+    amounts = np.asarray(amounts, dtype=np.float64)
+    days = np.asarray(dates).astype("datetime64[D]")
+    years = (days - days.min()).astype(np.float64) / DAYS_IN_A_YEAR
+    if not (amounts > 0).any() or not (amounts < 0).any():
+        return math.nan
+
+    def npv(x):
+        with np.errstate(over="ignore", invalid="ignore"):
+            return float(np.dot(amounts, np.exp(-x * years)))
+
+    def npv_derivative(x):
+        with np.errstate(over="ignore", invalid="ignore"):
+            return float(np.dot(-years * amounts, np.exp(-x * years)))
+
+    bracket = _bracket(npv)
+    if bracket is None:
+        return math.nan
+    return math.expm1(_find_root(npv, npv_derivative, math.log1p(guess), *bracket))
+
+
+def _log_abs_expm1(y):
+    if y > 0:
+        return y + math.log1p(-math.exp(-y))
+    return math.log(-math.expm1(y))
+
+
+def annuity_rate(payment, periods, future_value, deferral_periods=0):
+    # Per-period rate r at which equal payments made at times 0 .. periods - 1 grow to future_value
+    # at time periods + deferral_periods:
+    #     payment * (1 + r) ** (deferral_periods + 1) * ((1 + r) ** periods - 1) / r == future_value
+    # Each evaluation is O(1), unlike an NPV over one cash flow per period.
+    if payment <= 0 or future_value <= 0 or periods < 1:
+        return math.nan
+    target = math.log(future_value / payment)
+    growth_periods = deferral_periods + 1
+
+    def log_value(x):
+        if abs(x) < 1e-12:
+            return growth_periods * x + math.log(periods)
+        return growth_periods * x + _log_abs_expm1(periods * x) - _log_abs_expm1(x)
+
+    def log_value_derivative(x):
+        if abs(x) < 1e-12:
+            return growth_periods + (periods - 1) / 2
+        # d/dx ln|expm1(k x)| == k / (1 - exp(-k x))
+        return growth_periods + periods / -math.expm1(-periods * x) - 1 / -math.expm1(-x)
+
+    def f(x):
+        return log_value(x) - target
+
+    # log_value is increasing in x, so [-b, b] brackets the root once f changes sign over it
+    bracket = _bracket(f)
+    if bracket is None:
+        return math.nan
+    return math.expm1(_find_root(f, log_value_derivative, 0.0, *bracket))